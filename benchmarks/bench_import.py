@@ -0,0 +1,85 @@
+"""Import-time benchmark for the juanPlot plotting module
+
+    Measures, in fresh interpreters, the time to import fx_RNAseqPlotters and the time to the
+    first bar plot (import + data + plot on Agg), and fails when the import exceeds its budget.
+        python benchmarks/bench_import.py              # report and check the budget
+        python benchmarks/bench_import.py --detail     # also list the slowest imports (-X importtime)
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+contentDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'content')
+
+# budget for `import fx_RNAseqPlotters` in ms, measured on top of a bare interpreter;
+# numpy alone takes ~100-150 ms on a laptop, everything else must stay lazy
+IMPORT_BUDGET_MS = 300
+
+_importSnippet = '''
+import time
+t = time.perf_counter()
+import fx_RNAseqPlotters
+print((time.perf_counter() - t) * 1000)
+'''
+
+_firstPlotSnippet = '''
+import time
+t = time.perf_counter()
+import matplotlib
+matplotlib.use('Agg')
+from fx_RNAseqPlotters import plotBars_Hoang2020, GeneIndex
+import pandas as pd
+zfH = pd.read_csv('data/Hoang2020_10x_photoreceptors.csv')
+plotBars_Hoang2020(GeneIndex(zfH), 'rho')
+import matplotlib.pyplot as plt
+plt.gcf().canvas.draw()
+print((time.perf_counter() - t) * 1000)
+'''
+
+
+def _run(snippet):
+    out = subprocess.run([sys.executable, '-c', snippet], cwd=contentDir, check=True,
+        capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _slowestImports(n=15):
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import fx_RNAseqPlotters'],
+        cwd=contentDir, check=True, capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        selfTime, cumulative, name = [part.strip() for part in line.split(':', 1)[1].split('|')]
+        rows.append((int(cumulative), int(selfTime), name))
+    rows.sort(reverse=True)
+    return rows[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per measurement')
+    parser.add_argument('--budget', type=float, default=IMPORT_BUDGET_MS, help='import budget in ms')
+    parser.add_argument('--detail', action='store_true', help='list the slowest imports')
+    args = parser.parse_args()
+
+    imports = [_run(_importSnippet) for _ in range(args.repeat)]
+    firstPlot = [_run(_firstPlotSnippet) for _ in range(args.repeat)]
+    print('import fx_RNAseqPlotters : median {0:7.1f} ms  min {1:7.1f} ms  (budget {2:.0f} ms)'.format(
+        statistics.median(imports), min(imports), args.budget))
+    print('time to first plot       : median {0:7.1f} ms  min {1:7.1f} ms'.format(
+        statistics.median(firstPlot), min(firstPlot)))
+    if args.detail:
+        print('\nslowest imports (cumulative us, self us):')
+        for cumulative, selfTime, name in _slowestImports():
+            print('  {0:>9} {1:>9}  {2}'.format(cumulative, selfTime, name))
+    if min(imports) > args.budget:
+        print('import time is over budget')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
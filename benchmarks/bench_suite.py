@@ -0,0 +1,226 @@
+"""Benchmark suite for the juanPlot data and plotting paths (headless, Agg)
+
+    For every dataset layout and size (synthetic tables of 10 to 10,000 genes with the column
+    layout of the real csv files) it times: csv load (pandas and the columnar cache, cold and
+    warm), GeneIndex build, single-gene lookup, prefix and regex queries, bar plot creation and
+    heatmap rendering (including the draw). The csv files in content/data are benchmarked too.
+    Results are written to benchmarks/results/<git revision>.json so runs can be compared.
+        python benchmarks/bench_suite.py                        # full run, saved under the current revision
+        python benchmarks/bench_suite.py --sizes 10 100 --layouts Hoang2020 Sun2018
+        python benchmarks/bench_suite.py --compare 4669e1a      # compare the current revision with a saved run
+        python benchmarks/bench_suite.py --compare 4669e1a df3ece0
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+rootDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+contentDir = os.path.join(rootDir, 'content')
+resultsDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+sys.path.insert(0, contentDir)
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from fx_dataCache import loadDataset
+from fx_geneIndex import GeneIndex
+from fx_layouts import datasetLayouts, getLayout
+from fx_RNAseqPlotters import heatmap_dataset, plotBars_dataset
+
+defaultSizes = (10, 100, 1000, 10000)
+defaultLayouts = ('Angueyra2021', 'Ogawa2021', 'Hoang2020', 'Hoang2020_Ret', 'Hoang2020_PRDev', 'Sun2018', 'Nerli2022')
+# symbol families of the synthetic tables; 'opn' is the prefix query, 'tbx[0-9]+' the regex query
+_families = ('opn', 'tbx', 'foxq', 'gnat', 'gngt', 'crx', 'nr2e', 'si:ch211-', 'zgc:', 'rho')
+# csv files of content/data that are load-benchmarked when present
+realDatasets = (
+    'Angueyra2021_Photoreceptors.csv',
+    'Angueyra2021_Photoreceptors_opsinsOnly.csv',
+    'Hoang2020_10x_photoreceptors.csv',
+    'Hoang2020_HCs.csv',
+    'Sun2018_FACS_Rods.csv',
+)
+
+
+def syntheticDataset(layout, nRows, seed=0):
+    """Dataframe with the column layout of a dataset: symbol first, random counts in the value columns"""
+    layout = getLayout(layout)
+    used = [layout.valueColumns] + ([layout.pctColumns] if layout.pctColumns is not None else [])
+    nColumns = int(max(np.max(c) for c in used)) + 1
+    rng = np.random.default_rng(seed)
+    values = rng.gamma(.5, 20, size=(nRows, nColumns - 1)).round(3)
+    if layout.pctColumns is not None:
+        values[:, np.asarray(layout.pctColumns) - 1] = rng.uniform(0, 100, size=(nRows, len(layout.pctColumns))).round(2)
+    frame = pd.DataFrame(values, columns=['c{0}'.format(i) for i in range(1, nColumns)])
+    frame.insert(0, 'symbol', ['{0}{1}'.format(_families[i % len(_families)], i) for i in range(nRows)])
+    return frame
+
+
+def timeit(fn, repeat, setup=None):
+    """Times fn() repeat times (setup() before each, untimed); returns a list of seconds"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return times
+
+
+def _drawBars(layout, index, geneSymbol):
+    fig, ax = plt.subplots(figsize=(8, 6))
+    plotBars_dataset(layout, index, geneSymbol, ax=ax)
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def _drawHeatmap(layout, frame):
+    fig, ax = plt.subplots(figsize=(10, 20))
+    heatmap_dataset(layout, frame, ax=ax, norm='max')
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def benchLayout(layout, nRows, repeat, workDir):
+    """Timings (name -> list of seconds) for one layout and size"""
+    frame = syntheticDataset(layout, nRows)
+    csvPath = os.path.join(workDir, '{0}_{1}.csv'.format(layout, nRows))
+    frame.to_csv(csvPath, index=False)
+    cacheDir = csvPath + '.fxcache'
+    probe = frame['symbol'].iloc[nRows // 2]
+    index = GeneIndex(frame)
+    results = {
+        'load.read_csv': timeit(lambda: pd.read_csv(csvPath), repeat),
+        'load.cache_cold': timeit(lambda: loadDataset(csvPath, cacheDir), repeat,
+            setup=lambda: shutil.rmtree(cacheDir, ignore_errors=True)),
+        'load.cache_warm': timeit(lambda: loadDataset(csvPath, cacheDir), repeat),
+        'index.build': timeit(lambda: GeneIndex(frame), repeat),
+        'query.lookup': timeit(lambda: index.lookup(probe), repeat),
+        'query.pandas_lookup': timeit(lambda: frame[frame.symbol == probe], repeat),
+        # new GeneIndex each time so the query cache does not hide the search
+        'query.prefix': timeit(lambda: GeneIndex(frame).query('opn', 'prefix'), repeat),
+        'query.regex': timeit(lambda: GeneIndex(frame).query(r'tbx[0-9]+', 'match'), repeat),
+        'plot.bars': timeit(lambda: _drawBars(layout, index, probe), repeat),
+        'plot.heatmap': timeit(lambda: _drawHeatmap(layout, frame), repeat if nRows <= 1000 else 1),
+    }
+    return results
+
+
+def benchRealFiles(repeat, workDir):
+    """Load timings of the csv files shipped in content/data"""
+    results = {}
+    for fileName in realDatasets:
+        csvPath = os.path.join(contentDir, 'data', fileName)
+        if not os.path.exists(csvPath):
+            continue
+        cacheDir = os.path.join(workDir, fileName + '.fxcache')
+        results['{0}.read_csv'.format(fileName)] = timeit(lambda: pd.read_csv(csvPath), repeat)
+        results['{0}.cache_cold'.format(fileName)] = timeit(lambda: loadDataset(csvPath, cacheDir), repeat,
+            setup=lambda: shutil.rmtree(cacheDir, ignore_errors=True))
+        results['{0}.cache_warm'.format(fileName)] = timeit(lambda: loadDataset(csvPath, cacheDir), repeat)
+    return results
+
+
+def gitRevision():
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=rootDir, check=True,
+            capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=rootDir, check=True,
+            capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unversioned'
+    return rev + ('-dirty' if dirty else '')
+
+
+def _summary(times):
+    return {'min': min(times), 'median': statistics.median(times), 'n': len(times)}
+
+
+def runSuite(layouts, sizes, repeat):
+    workDir = tempfile.mkdtemp(prefix='juanPlot_bench_')
+    results = {}
+    try:
+        for layout in layouts:
+            for nRows in sizes:
+                start = time.perf_counter()
+                for name, times in benchLayout(layout, nRows, repeat, workDir).items():
+                    results['{0}/{1}/{2}'.format(layout, nRows, name)] = _summary(times)
+                print('{0:<16} {1:>6} rows  {2:6.1f} s'.format(layout, nRows, time.perf_counter() - start))
+        for name, times in benchRealFiles(repeat, workDir).items():
+            results['data/' + name] = _summary(times)
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+    return results
+
+
+def printResults(results):
+    for name, r in results.items():
+        print('{0:<52} median {1:9.3f} ms  min {2:9.3f} ms'.format(name, r['median'] * 1000, r['min'] * 1000))
+
+
+def loadResults(label):
+    with open(os.path.join(resultsDir, label + '.json')) as f:
+        return json.load(f)
+
+
+def compare(base, other):
+    """Prints the timings of two saved runs side by side (ratio > 1: other is slower)"""
+    a, b = loadResults(base), loadResults(other)
+    print('{0:<52} {1:>12} {2:>12} {3:>7}'.format('benchmark (median ms)', base, other, 'ratio'))
+    for name in a['results']:
+        if name not in b['results']:
+            continue
+        ta, tb = a['results'][name]['median'], b['results'][name]['median']
+        print('{0:<52} {1:12.3f} {2:12.3f} {3:7.2f}'.format(name, ta * 1000, tb * 1000, tb / ta if ta else float('nan')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(defaultSizes), help='rows of the synthetic datasets')
+    parser.add_argument('--layouts', nargs='+', default=list(defaultLayouts), choices=sorted(datasetLayouts), help='dataset layouts')
+    parser.add_argument('--repeat', type=int, default=3, help='repetitions per measurement')
+    parser.add_argument('--label', default=None, help='name of the saved run (default: git revision)')
+    parser.add_argument('--no-save', action='store_true', help='do not save the results')
+    parser.add_argument('--compare', nargs='+', metavar='LABEL', help='compare saved runs (one label: against the current revision)')
+    args = parser.parse_args()
+
+    if args.compare:
+        base = args.compare[0]
+        other = args.compare[1] if len(args.compare) > 1 else gitRevision()
+        compare(base, other)
+        return 0
+    results = runSuite(args.layouts, args.sizes, args.repeat)
+    printResults(results)
+    if not args.no_save:
+        label = args.label or gitRevision()
+        os.makedirs(resultsDir, exist_ok=True)
+        path = os.path.join(resultsDir, label + '.json')
+        with open(path, 'w') as f:
+            json.dump({
+                'label': label,
+                'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'matplotlib': matplotlib.__version__,
+                'sizes': args.sizes,
+                'repeat': args.repeat,
+                'results': results,
+            }, f, indent=1)
+        print('saved to ' + os.path.relpath(path))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""fx_aggregate
+
+    Per-cluster summaries (avg*/pct* tables) from raw single-cell counts
+    Reads a sparse count matrix (Matrix Market .mtx/.mtx.gz as written by 10x/Seurat, a CSR
+    .npz from scipy.sparse.save_npz, or any scipy sparse matrix) in chunks and reduces the
+    non-zero entries per (cluster, gene) with bincount. The result has the column layout of
+    Hoang2020_10x_photoreceptors.csv: symbol, avgMean, avg<cluster>..., pctMean, pct<cluster>...
+        zfH = aggregateCounts('matrix.mtx.gz', labels, genes='features.tsv.gz',
+            clusters=['R', 'UV', 'S', 'M1', 'M3', 'M4', 'L'])
+        plotBars_Hoang2020(zfH[zfH.symbol == 'rho'], 'rho', pctPlot=True)
+    Neither scipy nor the dense matrix is needed; memory is one chunk plus two clusters x genes arrays.
+"""
+import gzip
+
+import numpy as np
+
+from fx_timing import currentSpan, timed
+
+
+def _open(path):
+    return gzip.open(path, 'rt') if str(path).endswith('.gz') else open(path)
+
+
+def readGenes(path):
+    """Gene symbols from a text file with one gene per line (10x features.tsv: second column)"""
+    symbols = []
+    with _open(path) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            symbols.append(fields[1] if len(fields) > 1 else fields[0])
+    return symbols
+
+
+def _mtxTriplets(path, chunksize):
+    """Shape and chunks of (row, column, value) of a coordinate Matrix Market file (0-based)"""
+    import pandas as pd
+    f = _open(path)
+    try:
+        banner = f.readline()
+        if not banner.startswith('%%MatrixMarket') or 'coordinate' not in banner:
+            raise ValueError('{0} is not a coordinate Matrix Market file'.format(path))
+        pattern = 'pattern' in banner
+        line = f.readline()
+        while line.startswith('%'):
+            line = f.readline()
+        nRows, nColumns, _ = (int(x) for x in line.split())
+        yield nRows, nColumns
+        names = ['row', 'column'] if pattern else ['row', 'column', 'value']
+        for chunk in pd.read_csv(f, sep=r'\s+', header=None, names=names, chunksize=chunksize):
+            rows = chunk['row'].to_numpy(dtype=np.int64) - 1
+            columns = chunk['column'].to_numpy(dtype=np.int64) - 1
+            values = np.ones(rows.shape[0]) if pattern else chunk['value'].to_numpy(dtype=np.float64)
+            yield rows, columns, values
+    finally:
+        f.close()
+
+
+def _csrTriplets(matrix, chunksize):
+    """Shape and chunks of (row, column, value) of a CSR matrix (npz path or scipy sparse matrix)"""
+    if isinstance(matrix, str):
+        stored = np.load(matrix, allow_pickle=False)
+        fmt = stored['format'].item()
+        fmt = fmt.decode() if isinstance(fmt, bytes) else fmt
+        if fmt != 'csr':
+            raise ValueError('{0} holds a {1} matrix; save it as CSR'.format(matrix, fmt))
+        shape, data, indices, indptr = stored['shape'], stored['data'], stored['indices'], stored['indptr']
+    else:
+        matrix = matrix.tocsr()
+        shape, data, indices, indptr = matrix.shape, matrix.data, matrix.indices, matrix.indptr
+    yield int(shape[0]), int(shape[1])
+    for start in range(0, int(shape[0]), chunksize):
+        stop = min(start + chunksize, int(shape[0]))
+        begin, end = indptr[start], indptr[stop]
+        rows = np.repeat(np.arange(start, stop), np.diff(indptr[start:stop + 1]))
+        yield rows, indices[begin:end].astype(np.int64), np.asarray(data[begin:end], dtype=np.float64)
+
+
+@timed()
+def aggregateCounts(counts, labels, genes=None, clusters=None, cellsAsRows=None, chunksize=1000000,
+        symbolColumn='symbol', meanLabel='Mean', outPath=None):
+    """Mean expression and percent of cells expressing per cluster, for every gene
+    Arguments:
+        counts      : .mtx / .mtx.gz path, CSR .npz path or scipy sparse matrix (cells x genes or genes x cells)
+        labels      : cluster label of every cell (cells without a label in clusters are ignored)
+        genes       : gene symbols (list or path to genes.tsv / features.tsv); default gene0, gene1, ...
+        clusters    : cluster labels in output order, also used in the column names (default: sorted labels)
+        cellsAsRows : True if rows of counts are cells; default: inferred from the number of labels
+        chunksize   : non-zero entries per chunk for .mtx files, rows per chunk for CSR matrices
+        symbolColumn: name of the symbol column ('' writes an unnamed column, as in Hoang2020_HCs.csv)
+        meanLabel   : name of the across-cluster mean columns (avg<meanLabel>, pct<meanLabel>)
+        outPath     : if given, the table is also written there as csv
+    Returns:
+        pandas dataframe: symbol, avgMean, avg<cluster>..., pctMean, pct<cluster>...
+        (avgMean / pctMean are the means over the clusters)
+    """
+    import pandas as pd
+    span = currentSpan()
+    labels = np.asarray(labels)
+    if clusters is None:
+        clusters = sorted(set(labels.tolist()))
+    clusters = list(clusters)
+    clusterCode = {c: i for i, c in enumerate(clusters)}
+    # cluster of every cell, -1 for cells outside the requested clusters
+    cellCluster = np.array([clusterCode.get(label, -1) for label in labels.tolist()], dtype=np.int64)
+    cellsPerCluster = np.bincount(cellCluster[cellCluster >= 0], minlength=len(clusters))
+    if isinstance(counts, str) and not counts.endswith('.npz'):
+        triplets = _mtxTriplets(counts, chunksize)
+    else:
+        triplets = _csrTriplets(counts, chunksize)
+    nRows, nColumns = next(triplets)
+    if cellsAsRows is None:
+        if nRows == labels.shape[0] and nColumns != labels.shape[0]:
+            cellsAsRows = True
+        elif nColumns == labels.shape[0] and nRows != labels.shape[0]:
+            cellsAsRows = False
+        else:
+            raise ValueError('cannot tell cells from genes in a {0} x {1} matrix with {2} labels; set cellsAsRows'.format(
+                nRows, nColumns, labels.shape[0]))
+    nCells, nGenes = (nRows, nColumns) if cellsAsRows else (nColumns, nRows)
+    if labels.shape[0] != nCells:
+        raise ValueError('{0} labels for {1} cells'.format(labels.shape[0], nCells))
+    size = len(clusters) * nGenes
+    sums = np.zeros(size)
+    expressing = np.zeros(size)
+    for rows, columns, values in triplets:
+        cells, geneIdx = (rows, columns) if cellsAsRows else (columns, rows)
+        cluster = cellCluster[cells]
+        keep = (cluster >= 0) & (values != 0)
+        flat = cluster[keep] * nGenes + geneIdx[keep]
+        sums += np.bincount(flat, weights=values[keep], minlength=size)
+        expressing += np.bincount(flat, minlength=size)
+    span.mark('reduce')
+    sums = sums.reshape(len(clusters), nGenes).T
+    expressing = expressing.reshape(len(clusters), nGenes).T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg = np.where(cellsPerCluster > 0, sums / cellsPerCluster, 0)
+        pct = np.where(cellsPerCluster > 0, 100 * expressing / cellsPerCluster, 0)
+    if genes is None:
+        genes = ['gene{0}'.format(i) for i in range(nGenes)]
+    elif isinstance(genes, str):
+        genes = readGenes(genes)
+    if len(genes) != nGenes:
+        raise ValueError('{0} gene symbols for {1} genes'.format(len(genes), nGenes))
+    columns = {symbolColumn: list(genes), 'avg' + meanLabel: avg.mean(axis=1)}
+    columns.update(('avg{0}'.format(c), avg[:, i]) for i, c in enumerate(clusters))
+    columns['pct' + meanLabel] = pct.mean(axis=1)
+    columns.update(('pct{0}'.format(c), pct[:, i]) for i, c in enumerate(clusters))
+    table = pd.DataFrame(columns)
+    if outPath is not None:
+        table.to_csv(outPath, index=False)
+    if span:
+        span.note(cells=nCells, genes=nGenes, clusters=len(clusters))
+    return table
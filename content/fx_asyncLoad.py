@@ -0,0 +1,244 @@
+"""fx_asyncLoad
+
+    Concurrent loading of the datasets in the notebooks (JupyterLite/Pyodide or local Python)
+    All sources are fetched at once with asyncio; each one is parsed as soon as its download
+    ends, so the first dataset can be plotted while the others are still arriving.
+        loader = DatasetLoader({
+            'Angueyra2021': baseURL + 'Angueyra2021_Photoreceptors.csv',
+            'Hoang2020': baseURL + 'Hoang2020_10x_photoreceptors.csv',
+            'Sun2018': baseURL + 'Sun2018_FACS_Rods.csv'}).start()
+        loader.widget()                         # optional progress bars (ipywidgets)
+        zfH = await loader.get('Hoang2020')     # waits only for this dataset
+        datasets = await loader.wait()          # dict of all datasets
+    Inside Pyodide downloads use pyodide.http.pyfetch; elsewhere urllib (or plain file reads for
+    local paths) and pandas parsing run in worker threads. Try it locally with
+        python fx_asyncLoad.py                  # serves content/data over http and loads every csv
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+
+# dataset states, in order
+loadStates = ('queued', 'downloading', 'parsing', 'ready', 'failed')
+
+
+def inPyodide():
+    return sys.platform == 'emscripten'
+
+
+def readCsv(data):
+    """Default parser: pandas dataframe from the downloaded bytes"""
+    import pandas as pd
+    return pd.read_csv(io.BytesIO(data))
+
+
+def _readBlocking(source, onProgress, blockSize=1 << 16):
+    """Bytes of a URL or local path, reporting (bytes read, total bytes or None) after each block"""
+    if '://' in source:
+        from urllib.request import urlopen
+        f = urlopen(source)
+        length = f.headers.get('Content-Length')
+        total = int(length) if length else None
+    else:
+        f = open(source, 'rb')
+        total = os.fstat(f.fileno()).st_size
+    blocks = []
+    done = 0
+    with f:
+        for block in iter(lambda: f.read(blockSize), b''):
+            blocks.append(block)
+            done += len(block)
+            onProgress(done, total)
+    return b''.join(blocks)
+
+
+async def fetchBytes(source, onProgress=None):
+    """Downloads a URL (or reads a local path) without blocking the event loop"""
+    onProgress = onProgress or (lambda done, total: None)
+    if inPyodide():
+        from pyodide.http import pyfetch
+        response = await pyfetch(source)
+        if not response.ok:
+            raise OSError('{0}: HTTP {1}'.format(source, response.status))
+        data = await response.bytes()
+        onProgress(len(data), len(data))
+        return data
+    loop = asyncio.get_running_loop()
+    # progress is reported from the worker thread; hand it back to the loop
+    threadProgress = lambda done, total: loop.call_soon_threadsafe(onProgress, done, total)
+    return await loop.run_in_executor(None, _readBlocking, source, threadProgress)
+
+
+def _printProgress(name, state, info):
+    if state == 'parsing':
+        print('\t {0}: downloaded {1:.1f} MB in {2:.2f} s'.format(name, info['bytes'] / 2**20, info['seconds']))
+    elif state == 'ready':
+        print('\t {0}: ready ({1:.2f} s)'.format(name, info['seconds']))
+    elif state == 'failed':
+        print('\t {0}: failed ({1})'.format(name, info['error']))
+
+
+class DatasetLoader:
+    """Loads several datasets concurrently
+    Arguments:
+        sources         : dict of name -> URL or local path
+        parse           : function turning the downloaded bytes into a dataset (default: pandas read_csv)
+        progress        : True prints a line per finished download and parse; a function
+                          progress(name, state, info) is called on every state change instead
+    Attributes:
+        status          : dict name -> state ('queued', 'downloading', 'parsing', 'ready' or 'failed')
+        received        : dict name -> (bytes received, total bytes or None)
+        results         : dict of the datasets that are ready
+        errors          : dict of the exceptions of failed datasets
+    """
+
+    def __init__(self, sources, parse=readCsv, progress=True):
+        self.sources = dict(sources)
+        self.parse = parse
+        self.progress = _printProgress if progress is True else progress
+        self.status = {name: 'queued' for name in self.sources}
+        self.received = {name: (0, None) for name in self.sources}
+        self.results = {}
+        self.errors = {}
+        self._tasks = {}
+        self._listeners = []
+
+    def _setState(self, name, state, **info):
+        self.status[name] = state
+        if self.progress:
+            self.progress(name, state, info)
+        for listener in self._listeners:
+            listener(name)
+
+    def _received(self, name, done, total):
+        self.received[name] = (done, total)
+        for listener in self._listeners:
+            listener(name)
+
+    async def _load(self, name, source):
+        start = time.perf_counter()
+        try:
+            self._setState(name, 'downloading')
+            data = await fetchBytes(source, lambda done, total: self._received(name, done, total))
+            self._setState(name, 'parsing', bytes=len(data), seconds=time.perf_counter() - start)
+            if inPyodide():
+                # no threads in the browser: parse right away, between downloads
+                result = self.parse(data)
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(None, self.parse, data)
+        except Exception as error:
+            self.errors[name] = error
+            self._setState(name, 'failed', error=error, seconds=time.perf_counter() - start)
+            raise
+        self.results[name] = result
+        self._setState(name, 'ready', seconds=time.perf_counter() - start)
+        return result
+
+    def start(self):
+        """Starts all downloads on the running event loop (top-level await in notebooks)"""
+        loop = asyncio.get_running_loop()
+        for name, source in self.sources.items():
+            if name not in self._tasks:
+                self._tasks[name] = loop.create_task(self._load(name, source))
+        return self
+
+    async def get(self, name):
+        """Waits for one dataset and returns it"""
+        if name not in self._tasks:
+            self.start()
+        return await self._tasks[name]
+
+    async def wait(self):
+        """Waits for all datasets; returns a dict of the loaded ones (see errors for the others)"""
+        self.start()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        return dict(self.results)
+
+    async def asCompleted(self):
+        """Yields (name, dataset) in the order the datasets become ready"""
+        self.start()
+        async def named(name, task):
+            return name, await task
+        for future in asyncio.as_completed([named(name, task) for name, task in self._tasks.items()]):
+            try:
+                name, result = await future
+            except Exception:
+                # failed datasets are reported through progress and errors
+                continue
+            yield name, result
+
+    def widget(self):
+        """One progress bar per dataset (ipywidgets), updated while loading"""
+        import ipywidgets
+        bars = {}
+        for name in self.sources:
+            bars[name] = ipywidgets.FloatProgress(value=0, min=0, max=1, description=name,
+                layout=ipywidgets.Layout(width='50%'))
+        def update(name):
+            bar = bars[name]
+            done, total = self.received[name]
+            state = self.status[name]
+            bar.value = 1 if state in ('parsing', 'ready') else (done / total if total else 0)
+            bar.bar_style = {'ready': 'success', 'failed': 'danger'}.get(state, 'info')
+            bar.description = name if state != 'parsing' else name + ' (parsing)'
+        self._listeners.append(update)
+        for name in self.sources:
+            update(name)
+        return ipywidgets.VBox(list(bars.values()))
+
+
+async def loadDatasets(sources, parse=readCsv, progress=True):
+    """Loads all sources concurrently and returns a dict of name -> dataset"""
+    return await DatasetLoader(sources, parse, progress).wait()
+
+
+def staticServer(directory, delay=0.):
+    """Serves a directory over http on localhost in a background thread (for trying the loaders)
+    Arguments:
+        directory   : directory to serve
+        delay       : seconds of latency added per 64 kB block, to mimic a slow connection
+    Returns:
+        server (call server.shutdown() when done) and its base URL
+    """
+    import functools
+    import threading
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def copyfile(self, source, outputfile):
+            for block in iter(lambda: source.read(1 << 16), b''):
+                if delay:
+                    time.sleep(delay)
+                outputfile.write(block)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(Handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{0}/'.format(server.server_address[1])
+
+
+def _demo(delay=0.):
+    """Serves content/data on a local http server and loads every csv in it concurrently"""
+    dataDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    server, baseURL = staticServer(dataDir, delay)
+    sources = {os.path.splitext(f)[0]: baseURL + f for f in sorted(os.listdir(dataDir)) if f.endswith('.csv')}
+
+    async def run():
+        start = time.perf_counter()
+        loader = DatasetLoader(sources).start()
+        async for name, frame in loader.asCompleted():
+            print('{0} plottable after {1:.2f} s ({2} rows)'.format(name, time.perf_counter() - start, frame.shape[0]))
+        print('all datasets loaded in {0:.2f} s'.format(time.perf_counter() - start))
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    _demo(float(sys.argv[1]) if len(sys.argv) > 1 else 0.)
@@ -0,0 +1,231 @@
+"""fx_batchExport
+
+    Batch export of per-gene bar plot panels for long gene lists
+    Each gene becomes one page with a panel per dataset (as in the comparison cells of the
+    notebooks). Pages are rendered in a process pool, one Agg figure per worker, and written
+    as PNG files to a page directory; a multipage PDF is assembled from them in gene order.
+    Rendered pages are kept, so an interrupted export resumes where it stopped; genes missing
+    from every dataset are marked next to their page (<page>.notfound), so a resumed export still
+    reports them. The page directory records the options and dataset versions of its pages
+    (run.json); an export with other ones renders every page again.
+        exportGenePanels(['rho', 'tbx2a', 'foxq2'], {
+            'Angueyra2021': 'data/Angueyra2021_Photoreceptors.csv',
+            'Hoang2020': 'data/Hoang2020_10x_photoreceptors.csv',
+            'Sun2018': 'data/Sun2018_FACS_Rods.csv'}, 'candidates.pdf')
+    Process pools are not available inside Pyodide; run this on a local Python install.
+"""
+import json
+import os
+import re
+import sys
+import time
+from multiprocessing import get_context
+
+import numpy as np
+
+# per-worker state, set by _initWorker
+_worker = {}
+_runName = 'run.json'
+_pagePattern = re.compile(r'\d{5}_.*\.png(\.notfound)?$')
+
+
+def _pageName(i, geneSymbol):
+    # file names keep the gene order and stay valid for symbols such as si:ch211-1a2.3
+    return '{0:05d}_{1}.png'.format(i, re.sub(r'[^A-Za-z0-9._-]+', '_', geneSymbol))
+
+
+def _notFoundPath(path):
+    # empty marker next to the page of a gene that no dataset has
+    return path + '.notfound'
+
+
+def _prepareDatasets(datasets):
+    """Loads csv paths through the columnar cache in the parent, building missing caches once;
+    workers then only open them (see _loadDatasets)"""
+    from fx_dataCache import loadDataset
+    prepared = {}
+    for layout, source in datasets.items():
+        if isinstance(source, str):
+            dataset = loadDataset(source)
+            prepared[layout] = (dataset.cacheDir, dataset.header)
+        else:
+            prepared[layout] = source
+    return prepared
+
+
+def _loadDatasets(prepared):
+    from fx_dataCache import CachedDataset
+    from fx_geneIndex import GeneIndex
+    indexes = {}
+    for layout, source in prepared.items():
+        if isinstance(source, tuple):
+            indexes[layout] = CachedDataset(*source).index
+        elif isinstance(source, GeneIndex):
+            indexes[layout] = source
+        else:
+            indexes[layout] = GeneIndex(source)
+    return indexes
+
+
+def _initWorker(datasets, panels, pC, figsize, dpi, style):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    if style:
+        plt.style.use(style)
+    _worker['indexes'] = _loadDatasets(datasets)
+    _worker['panels'] = panels
+    _worker['pC'] = pC
+    _worker['dpi'] = dpi
+    # one figure per worker, cleared and reused for every page
+    _worker['fig'] = plt.figure(figsize=figsize)
+
+
+def _renderPage(task):
+    from fx_RNAseqPlotters import plotBars_dataset
+    i, geneSymbol, path = task
+    fig = _worker['fig']
+    fig.clear()
+    panels = _worker['panels']
+    nCols = 2 if len(panels) > 1 else 1
+    nRows = int(np.ceil(len(panels) / nCols))
+    found = False
+    for p, (layout, pctPlot) in enumerate(panels):
+        ax = fig.add_subplot(nRows, nCols, p + 1)
+        index = _worker['indexes'][layout]
+        if geneSymbol in index:
+            plotBars_dataset(layout, index, geneSymbol, ax=ax, pC=(_worker['pC'] or {}).get(layout), pctPlot=pctPlot)
+            ax.set_title('{0}\n{1}'.format(geneSymbol, layout), fontsize=20)
+            found = True
+        else:
+            ax.set_axis_off()
+            ax.set_title('{0}\n{1}: not found'.format(geneSymbol, layout), fontsize=20)
+    fig.tight_layout()
+    # write to a temporary name first so a killed worker never leaves a partial page behind
+    tmpPath = path + '.tmp'
+    fig.savefig(tmpPath, dpi=_worker['dpi'], format='png')
+    # the marker is settled before the page appears, so every kept page has the right one
+    if found:
+        if os.path.exists(_notFoundPath(path)):
+            os.remove(_notFoundPath(path))
+    else:
+        open(_notFoundPath(path), 'w').close()
+    os.replace(tmpPath, path)
+    return i, geneSymbol, found
+
+
+def _runRecord(prepared, panels, pC, figsize, dpi, style):
+    """Options and dataset versions the pages depend on, as stored in run.json"""
+    from fx_renderCache import datasetVersion
+    versions = {layout: source[1]['sha1'] if isinstance(source, tuple) else datasetVersion(source)
+        for layout, source in prepared.items()}
+    record = {'datasets': versions, 'panels': panels, 'pC': pC, 'figsize': figsize, 'dpi': dpi, 'style': style}
+    # through json so it compares equal to the stored record (tuples become lists, colors their repr)
+    return json.loads(json.dumps(record, default=repr, sort_keys=True))
+
+
+def _checkRun(pageDir, record, progress):
+    """Removes the pages of an earlier export with other options or datasets, then records this one"""
+    path = os.path.join(pageDir, _runName)
+    try:
+        with open(path) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = None
+    if previous != record:
+        stale = [f for f in os.listdir(pageDir) if _pagePattern.match(f)]
+        if stale and progress:
+            print('options or datasets changed since the pages in {0} were rendered: rendering them again'.format(pageDir))
+        for f in stale:
+            os.remove(os.path.join(pageDir, f))
+        tmpPath = path + '.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump(record, f, indent=1)
+        os.replace(tmpPath, path)
+
+
+def _progress(done, total, geneSymbol, start):
+    elapsed = time.perf_counter() - start
+    sys.stdout.write('\r{0}/{1} pages ({2:.1f} pages/s) {3:<30}'.format(done, total, done / max(elapsed, 1e-9), geneSymbol))
+    sys.stdout.flush()
+
+
+def exportGenePanels(genes, datasets, outPath, panels=None, processes=None, pC=None,
+        figsize=(14,12), dpi=100, style=None, resume=True, progress=True):
+    """Renders one page of bar plots per gene, in parallel
+    Arguments:
+        genes       : list of gene symbols (page order)
+        datasets    : dict of layout name -> csv path, dataframe or GeneIndex
+                      (csv paths are loaded through the columnar cache once, then opened by every worker)
+        outPath     : '<name>.pdf' for a multipage PDF, anything else is a directory of PNG pages
+        panels      : list of (layout name, pctPlot) panels per page
+                      (default: one panel per dataset, plus a pct panel when the layout has one)
+        processes   : number of worker processes (default: number of cores)
+        pC          : optional dict of layout name -> colors
+        figsize     : page size in inches
+        dpi         : resolution of the rendered pages
+        style       : matplotlib style applied in the workers (e.g. 'dark_background')
+        resume      : keep pages rendered by a previous, interrupted export with the same
+                      options and datasets
+        progress    : print progress
+    Returns:
+        list of genes that were not found in any dataset (in page order, including resumed pages)
+    """
+    from fx_layouts import getLayout
+    genes = list(dict.fromkeys(genes))
+    if panels is None:
+        panels = []
+        for layout in datasets:
+            panels.append((layout, False))
+            if getLayout(layout).pctColumns is not None:
+                panels.append((layout, True))
+    pdf = outPath.lower().endswith('.pdf')
+    pageDir = outPath + '.pages' if pdf else outPath
+    os.makedirs(pageDir, exist_ok=True)
+    # every cache is built here, before the workers open it
+    prepared = _prepareDatasets(datasets)
+    _checkRun(pageDir, _runRecord(prepared, panels, pC, figsize, dpi, style), progress)
+    tasks = []
+    missing = set()
+    for i, geneSymbol in enumerate(genes):
+        path = os.path.join(pageDir, _pageName(i, geneSymbol))
+        if not (resume and os.path.exists(path)):
+            tasks.append((i, geneSymbol, path))
+        elif os.path.exists(_notFoundPath(path)):
+            missing.add(geneSymbol)
+    if progress and len(tasks) < len(genes):
+        print('resuming: {0} of {1} pages already rendered'.format(len(genes) - len(tasks), len(genes)))
+    if tasks:
+        if processes is None:
+            processes = os.cpu_count() or 1
+        processes = max(1, min(processes, len(tasks)))
+        # spawn: workers must not inherit the parent's (possibly interactive) matplotlib state
+        context = get_context('spawn')
+        start = time.perf_counter()
+        with context.Pool(processes, initializer=_initWorker, initargs=(prepared, panels, pC, figsize, dpi, style)) as pool:
+            chunksize = max(1, len(tasks) // (processes * 8))
+            for done, (i, geneSymbol, found) in enumerate(pool.imap_unordered(_renderPage, tasks, chunksize), 1):
+                if not found:
+                    missing.add(geneSymbol)
+                if progress:
+                    _progress(done, len(tasks), geneSymbol, start)
+        if progress:
+            sys.stdout.write('\n')
+    if pdf:
+        _assemblePdf(genes, pageDir, outPath, figsize, dpi)
+    return [g for g in genes if g in missing]
+
+
+def _assemblePdf(genes, pageDir, outPath, figsize, dpi):
+    """Streams the rendered pages into a multipage PDF, in gene order"""
+    import matplotlib.image as mpimg
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_pdf import PdfPages
+    tmpPath = outPath + '.tmp'
+    with PdfPages(tmpPath) as pdf:
+        for i, geneSymbol in enumerate(genes):
+            page = mpimg.imread(os.path.join(pageDir, _pageName(i, geneSymbol)))
+            fig = Figure(figsize=(page.shape[1] / dpi, page.shape[0] / dpi), dpi=dpi)
+            fig.figimage(page, resize=False)
+            pdf.savefig(fig, dpi=dpi)
+    os.replace(tmpPath, outPath)
@@ -0,0 +1,118 @@
+"""fx_clustering
+
+    Row (and column) ordering of heatmaps by hierarchical clustering
+    Pairwise distances are computed in blocks of rows with matrix products (no python loop
+    over pairs), then passed to scipy's linkage; 'optimal' also reorders the leaves so that
+    neighbouring rows are as similar as possible. scipy is only imported when ordering is used.
+    Orderings are cached by the content of the matrix, so the same gene set with the same
+    normalization is only clustered once (toggling heatmapNorm back and forth reuses it).
+        order = clusterOrder(data, 'optimal')
+        heatmap_Hoang2020(gI, genes='opn', norm='max', order='optimal')
+"""
+import hashlib
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+orderModes = ('cluster', 'optimal')
+distanceMetrics = ('correlation', 'cosine', 'euclidean')
+
+# rows per block of the distance computation (block x n float64 temporaries)
+distanceBlock = 1024
+# optimal leaf ordering grows ~n^3 (about 4 s for 1000 rows); larger sets fall back to 'cluster'
+optimalRows = 1000
+# clustering needs n^2/2 distances (100 MB for 5000 rows) and linkage grows ~n^2; larger sets keep their order
+clusterRows = 5000
+# number of orderings kept
+orderCacheSize = 64
+_orderCache = OrderedDict()
+
+
+def pairwiseDistances(data, metric='correlation', blockSize=None):
+    """Condensed pairwise distances between rows (as scipy.spatial.distance.pdist), computed blockwise
+    Arguments:
+        data        : 2D numpy array (genes x samples)
+        metric      : 'correlation', 'cosine' or 'euclidean'
+        blockSize   : rows per block (default: distanceBlock)
+    """
+    if metric not in distanceMetrics:
+        raise ValueError('metric must be one of {0}, not {1!r}'.format(distanceMetrics, metric))
+    x = np.nan_to_num(np.asarray(data, dtype=np.float64))
+    n = x.shape[0]
+    blockSize = blockSize or distanceBlock
+    if metric == 'euclidean':
+        sq = np.einsum('ij,ij->i', x, x)
+    else:
+        if metric == 'correlation':
+            x = x - x.mean(axis=1, keepdims=True)
+        norms = np.sqrt(np.einsum('ij,ij->i', x, x))
+        # constant (or all-zero) rows end up at distance 1 from everything
+        x = np.divide(x, norms[:, None], out=np.zeros_like(x), where=norms[:, None] > 0)
+    condensed = np.empty(n * (n - 1) // 2)
+    for start in range(0, n, blockSize):
+        stop = min(start + blockSize, n)
+        # only the columns right of the diagonal are needed
+        product = x[start:stop] @ x[start:].T
+        if metric == 'euclidean':
+            block = np.sqrt(np.clip(sq[start:stop, None] + sq[None, start:] - 2 * product, 0, None))
+        else:
+            block = np.clip(1 - product, 0, 2)
+        for r in range(start, stop):
+            offset = r * n - r * (r + 1) // 2
+            condensed[offset:offset + n - r - 1] = block[r - start, r - start + 1:]
+    return condensed
+
+
+def _cacheKey(data, mode, method, metric):
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    return (hashlib.sha1(data.tobytes()).hexdigest(), data.shape, mode, method, metric)
+
+
+def clusterOrder(data, mode='optimal', method='average', metric='correlation'):
+    """Row order of data from hierarchical clustering
+    Arguments:
+        data        : 2D numpy array (genes x samples)
+        mode        : 'cluster' (dendrogram leaf order, for up to clusterRows rows) or 'optimal'
+                      (optimal leaf ordering, for up to optimalRows rows)
+        method      : linkage method (see scipy.cluster.hierarchy.linkage)
+        metric      : 'correlation', 'cosine' or 'euclidean'
+    Returns:
+        integer array with the new order of the rows
+    """
+    if mode not in orderModes:
+        raise ValueError('order must be one of {0}, not {1!r}'.format(orderModes, mode))
+    n = np.shape(data)[0]
+    if n < 3:
+        return np.arange(n)
+    if n > clusterRows:
+        warnings.warn("clustering {0} rows would be slow and take {1:.1f} GB (limit: clusterRows = {2}); rows keep their order".format(n, n * (n - 1) * 4 / 2**30, clusterRows))
+        return np.arange(n)
+    if mode == 'optimal' and n > optimalRows:
+        warnings.warn("optimal leaf ordering of {0} rows would be slow (limit: optimalRows = {1}); using order='cluster'".format(n, optimalRows))
+        mode = 'cluster'
+    key = _cacheKey(data, mode, method, metric)
+    if key in _orderCache:
+        _orderCache.move_to_end(key)
+        return _orderCache[key]
+    from scipy.cluster import hierarchy
+    distances = pairwiseDistances(data, metric)
+    linkage = hierarchy.linkage(distances, method=method)
+    if mode == 'optimal':
+        linkage = hierarchy.optimal_leaf_ordering(linkage, distances)
+    order = hierarchy.leaves_list(linkage)
+    _orderCache[key] = order
+    if len(_orderCache) > orderCacheSize:
+        _orderCache.popitem(last=False)
+    return order
+
+
+def groupedColumnOrder(data, groupsN, mode='optimal', method='average', metric='correlation'):
+    """Column order of data clustered within each subtype, so subtype groups stay in place"""
+    order = []
+    start = 0
+    for n in np.asarray(groupsN, dtype=int):
+        block = np.asarray(data)[:, start:start + n]
+        order.append(start + clusterOrder(block.T, mode, method, metric))
+        start += n
+    return np.concatenate(order) if order else np.arange(0)
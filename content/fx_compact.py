@@ -0,0 +1,129 @@
+"""fx_compact
+
+    Memory-compact loading of the expression tables into pandas
+    The csv is read in chunks. Expression columns are narrowed to float32, when that loses
+    no values (same rule as the columnar cache). String columns are interned into a table and
+    stored as a categorical when values repeat (gene symbols are mostly unique, so they stay
+    plain strings). Columns that no plot of the given layouts reads keep their position as
+    empty sparse placeholders, so the positional layouts of plotBars_* / heatmap_* still map.
+        zfH = loadCompact('data/Hoang2020_10x_photoreceptors.csv', 'Hoang2020')
+        plotBars_Hoang2020(zfH[zfH.symbol == 'rho'], 'rho')
+        zfH.attrs['memory']             # {'before': bytes as pd.read_csv, 'after': bytes}
+"""
+import numpy as np
+
+from fx_dataCache import narrowDtype
+from fx_layouts import getLayout
+from fx_timing import currentSpan, timed
+
+# string columns become categoricals when they have fewer distinct values than this fraction of rows
+categoricalFraction = .5
+
+
+def memoryFootprint(frame):
+    """Bytes used by a dataframe, including python strings"""
+    return int(frame.memory_usage(index=True, deep=True).sum())
+
+
+def plottedColumns(layouts):
+    """Positions of the csv columns read by any plot of the given layouts"""
+    columns = set()
+    for layout in layouts:
+        layout = getLayout(layout)
+        columns.update(int(i) for i in layout.valueColumns)
+        if layout.pctColumns is not None:
+            columns.update(int(i) for i in layout.pctColumns)
+    return columns
+
+
+def _intern(values, table):
+    """Codes of values in a growing string table (dict string -> code); missing values are -1"""
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        codes[i] = -1 if value != value or value is None else table.setdefault(value, len(table))
+    return codes
+
+
+def _numberStrings(values):
+    """Numbers of a chunk that pandas read as numeric in a string column, as strings (NaN stays missing)"""
+    out = np.full(len(values), None, dtype=object)
+    for i, value in enumerate(values):
+        if value == value:
+            out[i] = str(int(value)) if float(value).is_integer() else str(value)
+    return out
+
+
+@timed()
+def loadCompact(csvPath, layouts, keep=(), chunksize=10000, verbose=True):
+    """Reads a csv into a compact dataframe with the original column positions
+    Arguments:
+        csvPath     : path to the csv (or a file-like object)
+        layouts     : layout name or list of layout names whose plotted columns are kept
+        keep        : other columns kept by name (e.g. ('genename',))
+        chunksize   : rows per chunk (peak memory is about one chunk of the default frame)
+        verbose     : print the memory footprint before and after
+    Returns:
+        pandas dataframe; attrs['memory'] holds the footprint as pd.read_csv would load it and
+        after compaction, attrs['dropped'] the names of the emptied columns
+    """
+    import pandas as pd
+    span = currentSpan()
+    if isinstance(layouts, str) or not hasattr(layouts, '__iter__'):
+        layouts = [layouts]
+    readColumns = plottedColumns(layouts)
+    before = 0
+    names = None
+    kept = None
+    numeric = {}
+    strings = {}
+    nRows = 0
+    for chunk in pd.read_csv(csvPath, chunksize=chunksize):
+        if names is None:
+            names = list(chunk.columns)
+            # the symbol column (first column, named 'symbol' or unnamed) is always kept
+            kept = [i for i, name in enumerate(names) if i == 0 or name == 'symbol' or i in readColumns or name in keep]
+        before += memoryFootprint(chunk)
+        nRows += chunk.shape[0]
+        for i in kept:
+            column = chunk.iloc[:, i]
+            isNumeric = pd.api.types.is_numeric_dtype(column.dtype)
+            if isNumeric and i not in strings:
+                values = column.to_numpy(dtype=np.float64)
+                numeric.setdefault(i, []).append(values.astype(narrowDtype(values)))
+                continue
+            # the kind is decided per column: one string chunk makes the whole column strings,
+            # including earlier chunks that read as numbers (e.g. all missing)
+            table, codes = strings.setdefault(i, ({}, []))
+            codes.extend(_intern(_numberStrings(values), table) for values in numeric.pop(i, ()))
+            values = _numberStrings(column.to_numpy(dtype=np.float64)) if isNumeric else column.to_numpy(dtype=object)
+            codes.append(_intern(values, table))
+    span.mark('read')
+    if names is None:
+        raise ValueError('{0} has no rows'.format(csvPath))
+    sparseEmpty = pd.SparseDtype(np.float32, np.nan)
+    columns = {}
+    for i, name in enumerate(names):
+        if i in numeric:
+            # chunks that needed float64 upcast the whole column
+            columns[name] = np.concatenate(numeric[i])
+        elif i in strings:
+            table, codes = strings[i]
+            codes = np.concatenate(codes)
+            if len(table) < categoricalFraction * nRows:
+                columns[name] = pd.Categorical.from_codes(codes, categories=list(table))
+            else:
+                values = np.array(list(table) + [None], dtype=object)
+                columns[name] = values[codes]
+        else:
+            columns[name] = pd.arrays.SparseArray(np.full(nRows, np.nan, dtype=np.float32), dtype=sparseEmpty)
+    frame = pd.DataFrame(columns, columns=names)
+    span.mark('assemble')
+    after = memoryFootprint(frame)
+    frame.attrs['memory'] = {'before': before, 'after': after}
+    frame.attrs['dropped'] = [name for i, name in enumerate(names) if i not in kept]
+    if verbose:
+        print('{0}: {1:.2f} MB -> {2:.2f} MB ({3} rows, {4} of {5} columns kept)'.format(
+            getattr(csvPath, 'name', csvPath), before / 2**20, after / 2**20, nRows, len(kept), len(names)))
+    if span:
+        span.note(rows=nRows, before=before, after=after)
+    return frame
@@ -0,0 +1,285 @@
+"""fx_dataCache
+
+    Binary columnar cache for the RNAseq expression tables (content/data/*.csv)
+    The first load of a csv converts it into one .npy file per column (float32 expression
+    values, string tables for symbol/genename) plus a json header holding the cache version
+    and a hash of the source csv. Later loads memory-map the columns lazily, so a plot
+    only reads the columns and rows it slices. The cache is rebuilt when the csv changes:
+    every build writes a new build directory and then swaps the header to it, so column files
+    other processes may have memory-mapped are never rewritten.
+        zfH = loadDataset('data/Hoang2020_10x_photoreceptors.csv')
+        plotBars_Hoang2020(zfH.index, 'rho')
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from fx_geneIndex import GeneIndex
+from fx_timing import currentSpan, timed
+
+CACHE_VERSION = 2
+_headerName = 'header.json'
+
+
+def _sha1(path, blockSize=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(blockSize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def defaultCacheDir(csvPath):
+    """Cache directory for a csv: data/.fxcache/<csv name>/"""
+    csvPath = os.path.abspath(csvPath)
+    stem = os.path.splitext(os.path.basename(csvPath))[0]
+    return os.path.join(os.path.dirname(csvPath), '.fxcache', stem)
+
+
+def narrowDtype(values):
+    """float32 unless narrowing would lose values (overflow or non-zero values flushed to zero)"""
+    finite = values[np.isfinite(values)]
+    narrowed = finite.astype(np.float32)
+    if np.any(np.isinf(narrowed)) or np.any((narrowed == 0) & (finite != 0)):
+        return np.float64
+    return np.float32
+
+
+def _readHeader(cacheDir):
+    try:
+        with open(os.path.join(cacheDir, _headerName)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _writeHeader(cacheDir, header):
+    # written to a temporary file of its own and swapped in, so readers never see a partial
+    # header and concurrent writers do not share the temporary file
+    fd, tmpPath = tempfile.mkstemp(dir=cacheDir, prefix=_headerName + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(header, f, indent=1)
+        # mkstemp creates the file for its owner only
+        os.chmod(tmpPath, 0o644)
+        os.replace(tmpPath, os.path.join(cacheDir, _headerName))
+    except BaseException:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+
+
+def _removeOldBuilds(cacheDir, current):
+    """Removes superseded builds, except the newest one: processes that opened the previous header
+    may still be reading it. Unfinished builds are left to their builder unless a day old."""
+    builds = []
+    for d in os.listdir(cacheDir):
+        path = os.path.join(cacheDir, d)
+        if d.startswith('build-') and d != current:
+            builds.append((os.path.getmtime(path), path))
+        elif d.startswith('tmp') and os.path.isdir(path) and os.path.getmtime(path) < time.time() - 86400:
+            shutil.rmtree(path, ignore_errors=True)
+    for _, path in sorted(builds)[:-1]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _isCurrent(header, csvPath, cacheDir):
+    if header is None or header.get('version') != CACHE_VERSION:
+        return False
+    stat = os.stat(csvPath)
+    if header['size'] != stat.st_size:
+        return False
+    if header['mtime_ns'] == stat.st_mtime_ns:
+        return True
+    # touched but possibly unchanged (e.g. git checkout): fall back to the content hash
+    if header['sha1'] != _sha1(csvPath):
+        return False
+    # record the new mtime so the next load skips the hash again
+    header['mtime_ns'] = stat.st_mtime_ns
+    try:
+        _writeHeader(cacheDir, header)
+    except OSError:
+        # read-only cache: still current, only the hash is recomputed next time
+        pass
+    return True
+
+
+def buildCache(csvPath, cacheDir=None):
+    """Converts a csv into the columnar cache and returns its header
+    Columns are written to a temporary directory, renamed to cacheDir/build-<csv hash> when
+    complete and published by swapping the header; a published build is never written again.
+    """
+    if cacheDir is None:
+        cacheDir = defaultCacheDir(csvPath)
+    os.makedirs(cacheDir, exist_ok=True)
+    stat = os.stat(csvPath)
+    tmpDir = tempfile.mkdtemp(dir=cacheDir, prefix='tmp')
+    try:
+        os.chmod(tmpDir, 0o755)
+        header = _writeColumns(csvPath, stat, tmpDir)
+        header['build'] = 'build-' + header['sha1'][:16]
+        try:
+            os.rename(tmpDir, os.path.join(cacheDir, header['build']))
+        except OSError:
+            # another process finished the same build first: its files are identical
+            if not os.path.isdir(os.path.join(cacheDir, header['build'])):
+                raise
+            shutil.rmtree(tmpDir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmpDir, ignore_errors=True)
+        raise
+    # header is written last so an interrupted build is never mistaken for a valid cache
+    _writeHeader(cacheDir, header)
+    _removeOldBuilds(cacheDir, header['build'])
+    return header
+
+
+def _writeColumns(csvPath, stat, buildDir):
+    """Writes one .npy file per column of the csv into buildDir and returns the header"""
+    import pandas as pd
+    data = pd.read_csv(csvPath)
+    kinds = []
+    for i, name in enumerate(data.columns):
+        column = data[name]
+        path = os.path.join(buildDir, 'col{0:03d}.npy'.format(i))
+        if pd.api.types.is_numeric_dtype(column.dtype):
+            values = column.to_numpy(dtype=np.float64)
+            np.save(path, values.astype(narrowDtype(values)), allow_pickle=False)
+            kinds.append('numeric')
+        else:
+            # string table; missing entries are kept in a separate mask
+            missing = column.isna().to_numpy()
+            np.save(path, column.fillna('').astype(str).to_numpy().astype(str), allow_pickle=False)
+            if missing.any():
+                np.save(os.path.join(buildDir, 'col{0:03d}.na.npy'.format(i)), missing, allow_pickle=False)
+            kinds.append('string')
+    return {
+        'version': CACHE_VERSION,
+        'source': os.path.basename(csvPath),
+        'sha1': _sha1(csvPath),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'nRows': int(data.shape[0]),
+        'columns': [str(c) for c in data.columns],
+        'kinds': kinds,
+    }
+
+
+class CachedDataset:
+    """Memory-mapped, column-wise view of a cached expression table
+    Arguments:
+        cacheDir        : directory written by buildCache
+        header          : parsed header.json (read from cacheDir if not given)
+    """
+
+    def __init__(self, cacheDir, header=None):
+        self.cacheDir = cacheDir
+        self.header = header if header is not None else _readHeader(cacheDir)
+        # directory of the columns; stays the same even if the cache is rebuilt meanwhile
+        self.buildDir = os.path.join(cacheDir, self.header['build']) if cacheDir is not None else None
+        self.columns = list(self.header['columns'])
+        self.kinds = list(self.header['kinds'])
+        self.shape = (self.header['nRows'], len(self.columns))
+        self._columns = {}
+        self._index = None
+
+    @property
+    def version(self):
+        """Hash of the source csv, changes whenever the data does"""
+        return self.header['sha1']
+
+    def _position(self, column):
+        if isinstance(column, str):
+            return self.columns.index(column)
+        return int(column)
+
+    def column(self, column):
+        """Memory-mapped values of one column (by name or position), loaded on first use"""
+        i = self._position(column)
+        if i not in self._columns:
+            path = os.path.join(self.buildDir, 'col{0:03d}.npy'.format(i))
+            if self.kinds[i] == 'numeric':
+                self._columns[i] = np.load(path, mmap_mode='r', allow_pickle=False)
+            else:
+                values = np.load(path, allow_pickle=False).astype(object)
+                naPath = os.path.join(self.buildDir, 'col{0:03d}.na.npy'.format(i))
+                if os.path.exists(naPath):
+                    values[np.load(naPath, allow_pickle=False)] = np.nan
+                self._columns[i] = values
+        return self._columns[i]
+
+    @property
+    def symbolColumn(self):
+        if 'symbol' in self.columns:
+            return 'symbol'
+        return self.columns[0]
+
+    @property
+    def symbols(self):
+        return self.column(self.symbolColumn)
+
+    @property
+    def index(self):
+        """GeneIndex over this dataset (built on first use)"""
+        if self._index is None:
+            self._index = GeneIndex(self)
+        return self._index
+
+    def rows(self, positions, columns=None):
+        """Dataframe with the original column layout for the given row positions
+        Arguments:
+            positions   : row positions (e.g. from GeneIndex.query)
+            columns     : optional column positions/names to read; the others are returned as NaN
+                          so positional slicing (iloc) in plotBars_*/heatmap_* still lines up
+        """
+        import pandas as pd
+        positions = np.asarray(positions, dtype=np.intp)
+        wanted = None
+        if columns is not None:
+            wanted = {self._position(c) for c in columns}
+            wanted.add(self._position(self.symbolColumn))
+        frame = {}
+        for i, name in enumerate(self.columns):
+            if wanted is None or i in wanted:
+                frame[name] = np.asarray(self.column(i)[positions])
+            else:
+                frame[name] = np.full(positions.shape[0], np.nan, dtype=np.float32)
+        return pd.DataFrame(frame, index=positions)
+
+    def lookup(self, symbol, columns=None):
+        return self.index.lookup(symbol, columns)
+
+    def toFrame(self):
+        """Full dataframe, equivalent to pd.read_csv on the source (numeric columns narrowed to float32)"""
+        return self.rows(np.arange(self.shape[0]))
+
+
+@timed()
+def loadDataset(csvPath, cacheDir=None, rebuild=False):
+    """Loads a csv through the columnar cache, building or refreshing the cache as needed
+    Arguments:
+        csvPath         : path to the source csv (e.g. 'data/Hoang2020_10x_photoreceptors.csv')
+        cacheDir        : cache location (default: data/.fxcache/<csv name>/)
+        rebuild         : force conversion even if the cache is current
+    Returns:
+        CachedDataset
+    """
+    span = currentSpan()
+    if cacheDir is None:
+        cacheDir = defaultCacheDir(csvPath)
+    header = None if rebuild else _readHeader(cacheDir)
+    current = _isCurrent(header, csvPath, cacheDir)
+    span.mark('check')
+    if not current:
+        header = buildCache(csvPath, cacheDir)
+        span.mark('build')
+    dataset = CachedDataset(cacheDir, header)
+    span.mark('open')
+    if span:
+        span.note(rows=header['nRows'], built=not current)
+    return dataset
@@ -0,0 +1,309 @@
+"""fx_enrichment
+
+    Gene selection by expression values instead of symbols
+    Conditions are written with terms of the dataset columns and subtypes and evaluated as
+    boolean masks over whole-dataset arrays; the selected genes are ranked with argpartition.
+    Term arrays and condition masks are cached on the GeneIndex, so refining a query only
+    computes what changed.
+        gI = GeneIndex(zfH)
+        genes, values = queryGenes(gI, 'Hoang2020',
+            pct('UV') > 30, enrichment('UV', over=['S', 'M1', 'M3', 'M4', 'L']) >= 4,
+            rank=enrichment('UV', over=['S', 'M1', 'M3', 'M4', 'L']), k=50)
+        heatmap_Hoang2020(gI, genes=genes, norm='max')
+        # DE tables: rank by adjusted p-value, smallest first
+        queryGenes(gA, 'Angueyra2021', enrichment('UV', over=['S', 'M', 'L']) >= 4, col('padj') < .01,
+            rank=col('padj'), ascending=True, k=50)
+    Terms: col(name) is a csv column (e.g. 'padj', 'log2FoldChange', 'baseMean', 'pctUV'),
+    avg(group) / pct(group) the mean value / percent expressing of a subtype (a layout group label),
+    enrichment(group, over) the ratio of avg(group) to the largest avg of the other groups,
+    specificity(method, group) a specificity score (tau, gini, shannon, fold; see fx_specificity).
+    Conditions combine with & (and), | (or) and ~ (not); several conditions passed to queryGenes
+    must all hold.
+"""
+import operator
+
+import numpy as np
+
+from fx_geneIndex import GeneIndex
+from fx_layouts import getLayout
+from fx_normalize import columnBlock, groupMeans
+from fx_specificity import datasetSpecificity, specificityMethods
+from fx_timing import currentSpan, timed
+
+_comparisons = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le, '==': operator.eq, '!=': operator.ne}
+
+
+class Term:
+    """Per-gene value computed from the dataset; comparing it with a number gives a Condition"""
+    key = None
+
+    def values(self, engine):
+        raise NotImplementedError
+
+    def _compare(self, op, threshold):
+        return Condition(self, op, threshold)
+
+    def __gt__(self, threshold):
+        return self._compare('>', threshold)
+
+    def __ge__(self, threshold):
+        return self._compare('>=', threshold)
+
+    def __lt__(self, threshold):
+        return self._compare('<', threshold)
+
+    def __le__(self, threshold):
+        return self._compare('<=', threshold)
+
+    def __eq__(self, threshold):
+        return self._compare('==', threshold)
+
+    def __ne__(self, threshold):
+        return self._compare('!=', threshold)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.key[0], ', '.join(repr(k) for k in self.key[1:]))
+
+
+class Column(Term):
+    def __init__(self, name):
+        self.name = name
+        self.key = ('col', name)
+
+    def values(self, engine):
+        return engine.column(self.name)
+
+
+class GroupMean(Term):
+    def __init__(self, group, pctPlot=False):
+        self.group = group
+        self.pctPlot = pctPlot
+        self.key = ('pct' if pctPlot else 'avg', group)
+
+    def values(self, engine):
+        return engine.groupMeans(self.pctPlot)[:, engine.groupPosition(self.group)]
+
+
+class Enrichment(Term):
+    def __init__(self, group, over=None, pctPlot=False, pseudocount=0):
+        self.group = group
+        self.over = None if over is None else tuple(over)
+        self.pctPlot = pctPlot
+        self.pseudocount = pseudocount
+        self.key = ('enrichment', group, self.over, pctPlot, pseudocount)
+
+    def values(self, engine):
+        means = engine.groupMeans(self.pctPlot)
+        target = engine.groupPosition(self.group)
+        if self.over is None:
+            others = [i for i in range(means.shape[1]) if i != target]
+        else:
+            others = [engine.groupPosition(g) for g in self.over]
+        num = means[:, target] + self.pseudocount
+        den = means[:, others].max(axis=1) + self.pseudocount
+        # genes absent from all other groups are infinitely enriched; 0/0 is NaN and never selected
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return num / den
+
+
+class Specificity(Term):
+    def __init__(self, method='tau', group=None, pctPlot=False, log=True, pseudocount=0):
+        if method not in specificityMethods:
+            raise ValueError('method must be one of {0}, not {1!r}'.format(specificityMethods, method))
+        self.method = method
+        self.group = group
+        self.pctPlot = pctPlot
+        self.log = log
+        self.pseudocount = pseudocount
+        self.key = ('specificity', method, group, pctPlot, log, pseudocount)
+
+    def values(self, engine):
+        def compute():
+            scores = datasetSpecificity(engine.index, engine.layout, self.pctPlot, self.log, self.pseudocount)
+            if self.group is None:
+                return scores[self.method]
+            # genes peaking in another subtype are not specific to this one
+            return np.where(scores['top'] == engine.groupPosition(self.group), scores[self.method], np.nan)
+        return engine.cached(self.key, compute)
+
+
+def col(name):
+    """Csv column by name (e.g. 'padj', 'log2FoldChange', 'baseMean', 'pctUV')"""
+    return Column(name)
+
+
+def avg(group):
+    """Mean value of a subtype (group label of the layout, e.g. 'UV')"""
+    return GroupMean(group)
+
+
+def pct(group):
+    """Mean percent of cells expressing in a subtype"""
+    return GroupMean(group, pctPlot=True)
+
+
+def enrichment(group, over=None, pctPlot=False, pseudocount=0):
+    """Ratio of a subtype's mean to the largest mean of the other subtypes
+    Arguments:
+        group       : subtype label (e.g. 'UV')
+        over        : subtypes compared against (default: all other subtypes of the layout)
+        pctPlot     : compare percent expressing instead of values
+        pseudocount : added to both means (dampens ratios of barely expressed genes)
+    """
+    return Enrichment(group, over, pctPlot, pseudocount)
+
+
+def specificity(method='tau', group=None, pctPlot=False, log=True, pseudocount=0):
+    """Cell-type specificity score of each gene (see fx_specificity)
+    Arguments:
+        method      : 'tau', 'gini', 'shannon' or 'fold'
+        group       : if given, NaN for genes whose highest subtype is another one
+        pctPlot     : score percent expressing instead of values
+        log         : tau, gini and shannon of log2(mean + 1)
+        pseudocount : added to both means of the fold ratio
+    """
+    return Specificity(method, group, pctPlot, log, pseudocount)
+
+
+class Condition:
+    """Boolean mask over all genes; combine with &, | and ~"""
+
+    def __init__(self, term, op, threshold):
+        if op not in _comparisons:
+            raise ValueError('unknown comparison {0!r}'.format(op))
+        self.term = term
+        self.op = op
+        self.threshold = threshold
+        self.key = ('cond', term.key, op, threshold)
+
+    def mask(self, engine):
+        return engine.cached(self.key, lambda: _comparisons[self.op](self.term.values(engine), self.threshold))
+
+    def __and__(self, other):
+        return Combined('&', self, other)
+
+    def __or__(self, other):
+        return Combined('|', self, other)
+
+    def __invert__(self):
+        return Combined('~', self)
+
+    def __repr__(self):
+        return '{0!r} {1} {2!r}'.format(self.term, self.op, self.threshold)
+
+
+class Combined(Condition):
+    def __init__(self, op, *conditions):
+        self.op = op
+        self.conditions = conditions
+        self.key = (op,) + tuple(c.key for c in conditions)
+
+    def mask(self, engine):
+        def compute():
+            masks = [c.mask(engine) for c in self.conditions]
+            if self.op == '~':
+                return ~masks[0]
+            if self.op == '&':
+                return masks[0] & masks[1]
+            return masks[0] | masks[1]
+        return engine.cached(self.key, compute)
+
+    def __repr__(self):
+        if self.op == '~':
+            return '~({0!r})'.format(self.conditions[0])
+        return '({0!r}) {1} ({2!r})'.format(self.conditions[0], self.op, self.conditions[1])
+
+
+class QueryEngine:
+    """Whole-dataset arrays of one dataset layout for queryGenes
+    Arguments:
+        data        : GeneIndex (or dataframe / CachedDataset) of the dataset
+        layout      : DatasetLayout or its name
+    Arrays and masks are stored in the GeneIndex cache and shared by engines of the same index.
+    """
+
+    def __init__(self, data, layout):
+        self.index = data if isinstance(data, GeneIndex) else GeneIndex(data)
+        self.layout = getLayout(layout)
+        source = self.index.data
+        self.columnNames = [str(c) for c in (source.columns if hasattr(source, 'columns') else [])]
+
+    def cached(self, key, compute):
+        key = ('query', self.layout.name) + key
+        cache = self.index.cache
+        if key not in cache:
+            cache[key] = np.ascontiguousarray(compute())
+        return cache[key]
+
+    def column(self, name):
+        """Named csv column as a float array"""
+        if name not in self.columnNames:
+            raise KeyError('{0!r} is not a column of this dataset; columns are {1}'.format(name, self.columnNames))
+        position = self.columnNames.index(name)
+        return self.cached(('col', name), lambda: columnBlock(self.index.data, [position])[:, 0])
+
+    def groupPosition(self, group):
+        labels = list(self.layout.groupsLabels)
+        if group in labels:
+            return labels.index(group)
+        heatmapLabels = list(self.layout.heatmapLabels)
+        if group in heatmapLabels:
+            return heatmapLabels.index(group)
+        raise KeyError('{0!r} is not a group of {1}; groups are {2}'.format(group, self.layout.name, labels))
+
+    def groupMeans(self, pctPlot=False):
+        """Mean of each subtype (genes x groups)"""
+        def compute():
+            return groupMeans(columnBlock(self.index.data, self.layout.columns(pctPlot)), self.layout.groupsN)
+        return self.cached(('groupMeans', pctPlot), compute)
+
+    def mask(self, conditions):
+        """Genes passing all conditions"""
+        mask = np.ones(len(self.index), dtype=bool)
+        for condition in conditions:
+            mask &= condition.mask(self)
+        return mask
+
+    def select(self, conditions=(), rank=None, ascending=False, k=None):
+        """Positions and rank values of the top-k genes passing all conditions (see queryGenes)"""
+        span = currentSpan()
+        candidates = np.flatnonzero(self.mask(conditions))
+        span.mark('mask')
+        if rank is None:
+            positions = candidates if k is None else candidates[:k]
+            return positions, np.full(positions.shape[0], np.nan)
+        if isinstance(rank, str):
+            rank = col(rank)
+        values = rank.values(self)[candidates]
+        # NaN ranks last in either direction
+        keys = np.where(np.isnan(values), np.inf, values if ascending else -values)
+        if k is not None and k < keys.shape[0]:
+            top = np.argpartition(keys, k - 1)[:k] if k > 0 else np.empty(0, dtype=np.intp)
+        else:
+            top = np.arange(keys.shape[0])
+        top = top[np.argsort(keys[top], kind='stable')]
+        span.mark('rank')
+        if span:
+            span.note(passed=candidates.shape[0], returned=top.shape[0])
+        return candidates[top], values[top]
+
+
+@timed()
+def queryGenes(data, layout, *conditions, rank=None, ascending=False, k=50):
+    """Genes passing all conditions, ranked
+    Arguments:
+        data        : GeneIndex (or dataframe) of the dataset; a GeneIndex keeps arrays and masks cached
+        layout      : DatasetLayout or its name (defines the subtypes of avg, pct and enrichment)
+        conditions  : conditions that must all hold (e.g. pct('UV') > 30)
+        rank        : term (or column name) to rank by; None keeps csv order
+        ascending   : smallest first (e.g. for padj); default largest first
+        k           : number of genes returned (None: all)
+    Returns:
+        genes       : gene symbols in rank order (pass as genes= to heatmap_*)
+        values      : rank value of each gene (NaN without rank)
+    """
+    engine = QueryEngine(data, layout)
+    positions, values = engine.select(conditions, rank, ascending, k)
+    return engine.index.symbols[positions].tolist(), values
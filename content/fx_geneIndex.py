@@ -0,0 +1,230 @@
+"""fx_geneIndex
+
+    Gene symbol index for the RNAseq datasets used by juanPlot
+    Built once per dataset so that plotBars_* and heatmap_* lookups do not scan
+    the whole 'symbol' column every time a gene is plotted.
+        gI = GeneIndex(gf)
+        plotBars(gI, 'rho')
+        heatmap(gI, genes='opn')
+"""
+import re
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+
+from fx_timing import currentSpan, timed
+
+# characters that end the literal prefix of a regular expression
+_regexSpecial = set('.^$*+?{}[]\\|()')
+
+
+def findSymbolColumn(data):
+    # most tables carry 'symbol'; Hoang2020_HCs stores it in an unnamed first column
+    if 'symbol' in data.columns:
+        return 'symbol'
+    return data.columns[0]
+
+
+def _literalPrefix(pattern):
+    """Returns the literal text a regular expression must start with ('' if none)"""
+    prefix = []
+    for i, c in enumerate(pattern):
+        if c in _regexSpecial:
+            # a quantifier makes the preceding character optional/repeatable
+            if c in '*?{' and prefix:
+                prefix.pop()
+            break
+        prefix.append(c)
+    return ''.join(prefix)
+
+
+def _splitAlternatives(pattern):
+    """Splits a regular expression on its top-level '|' (None if it cannot be split safely)"""
+    branches = []
+    depth = 0
+    start = 0
+    escaped = False
+    inClass = False
+    for i, c in enumerate(pattern):
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif inClass:
+            if c == ']':
+                inClass = False
+        elif c == '[':
+            inClass = True
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == '|' and depth == 0:
+            branches.append(pattern[start:i])
+            start = i + 1
+    if depth != 0 or inClass:
+        return None
+    branches.append(pattern[start:])
+    return branches
+
+
+class GeneIndex:
+    """Hash and prefix index over the gene symbols of a dataset
+    Arguments:
+        data            : pandas dataframe (e.g. gf, zfO, zfH, zfS) or any object
+                          exposing .symbols and .rows(positions, columns=None)
+        symbolColumn    : column holding gene symbols (default: 'symbol' or first column)
+    """
+
+    @timed('GeneIndex')
+    def __init__(self, data, symbolColumn=None):
+        self.data = data
+        if hasattr(data, 'iloc'):
+            if symbolColumn is None:
+                symbolColumn = findSymbolColumn(data)
+            symbols = data[symbolColumn].to_numpy()
+            self._rows = None
+        else:
+            symbols = np.asarray(data.symbols)
+            self._rows = data.rows
+        self.symbolColumn = symbolColumn
+        symbols = [str(s) for s in symbols]
+        self.symbols = np.array(symbols, dtype=object)
+        # hash map from symbol to row position; duplicated symbols (e.g. 5s_rrna in Sun2018)
+        # keep all their positions in a separate map
+        self._position = dict(zip(symbols, range(len(symbols))))
+        self._duplicates = {}
+        if len(self._position) < len(symbols):
+            duplicated = {s for s, n in Counter(symbols).items() if n > 1}
+            for i, s in enumerate(symbols):
+                if s in duplicated:
+                    self._duplicates.setdefault(s, []).append(i)
+            self._duplicates = {s: np.array(p, dtype=np.intp) for s, p in self._duplicates.items()}
+        # sorted symbols for prefix queries; stable so duplicates keep file order
+        # (datasets can provide the order precomputed, e.g. fx_sharedData)
+        order = getattr(data, 'symbolOrder', None)
+        if order is None:
+            order = sorted(range(len(symbols)), key=symbols.__getitem__)
+        self._order = np.array(order, dtype=np.intp)
+        self._sorted = [symbols[i] for i in self._order.tolist()]
+        self._queryCache = {}
+        # derived whole-dataset arrays (e.g. normalized matrices) keyed by their parameters
+        self.cache = {}
+        currentSpan().note(rows=len(symbols))
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol):
+        return symbol in self._position
+
+    def positions(self, symbol):
+        """Row positions for an exact symbol (empty array if not found)"""
+        if symbol in self._duplicates:
+            return self._duplicates[symbol]
+        i = self._position.get(symbol)
+        if i is None:
+            return np.empty(0, dtype=np.intp)
+        return np.array([i], dtype=np.intp)
+
+    def prefixPositions(self, prefix):
+        """Row positions of all symbols starting with prefix, sorted by symbol"""
+        if not prefix:
+            return self._order
+        lo = bisect_left(self._sorted, prefix)
+        # every string starting with prefix sorts below prefix + highest code point
+        hi = bisect_left(self._sorted, prefix + '\U0010ffff', lo)
+        return self._order[lo:hi]
+
+    def matchPositions(self, pattern):
+        """Row positions of symbols matching a regular expression at their start (re.match), sorted by symbol"""
+        key = ('match', pattern)
+        if key not in self._queryCache:
+            regex = re.compile(pattern)
+            branches = _splitAlternatives(pattern)
+            if branches is None or pattern.startswith('^'):
+                candidates = self._order
+            else:
+                prefixes = [_literalPrefix(b) for b in branches]
+                if '' in prefixes:
+                    candidates = self._order
+                else:
+                    # narrow to the sorted ranges of each branch's literal prefix
+                    candidates = np.unique(np.concatenate([self.prefixPositions(p) for p in prefixes]))
+                    candidates = candidates[np.argsort(self.symbols[candidates], kind='stable')]
+            hits = [p for p in candidates if regex.match(self.symbols[p])]
+            self._queryCache[key] = np.array(hits, dtype=np.intp)
+        return self._queryCache[key]
+
+    def containsPositions(self, pattern):
+        """Row positions of symbols containing a regular expression (str.contains), sorted by symbol"""
+        key = ('contains', pattern)
+        if key not in self._queryCache:
+            regex = re.compile(pattern)
+            hits = [p for p in self._order if regex.search(self.symbols[p])]
+            self._queryCache[key] = np.array(hits, dtype=np.intp)
+        return self._queryCache[key]
+
+    def query(self, genes, mode='prefix'):
+        """Row positions for a query
+        Arguments:
+            genes       : symbol, prefix or regular expression; or a list of exact symbols
+            mode        : 'exact', 'prefix', 'match' (regex at start) or 'contains' (regex anywhere)
+        """
+        if not isinstance(genes, str):
+            hits = [self.positions(g) for g in genes]
+            if not hits:
+                return np.empty(0, dtype=np.intp)
+            return np.concatenate(hits)
+        if mode == 'exact':
+            return self.positions(genes)
+        if mode == 'prefix':
+            return self.prefixPositions(genes)
+        if mode == 'match':
+            return self.matchPositions(genes)
+        if mode == 'contains':
+            return self.containsPositions(genes)
+        raise ValueError("mode must be 'exact', 'prefix', 'match' or 'contains', not {0!r}".format(mode))
+
+    def rows(self, positions, columns=None):
+        """Dataframe rows (original column layout) for the given row positions
+        columns limits what is read from a CachedDataset (e.g. layout.columns(pctPlot)); the
+        other columns come back as NaN
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        if self._rows is None:
+            # rows of a dataframe are already in memory, every column is returned
+            return self.data.iloc[positions]
+        return self._rows(positions, columns)
+
+    def lookup(self, symbol, columns=None):
+        """Rows for an exact symbol, equivalent to gf[gf['symbol']==symbol]"""
+        return self.rows(self.positions(symbol), columns)
+
+    def select(self, genes, mode='prefix', columns=None):
+        """Rows for a query (see query), sorted by symbol like the notebook heatmap cells"""
+        return self.rows(self.query(genes, mode=mode), columns)
+
+
+def resolveRows(data, genes, mode='exact', columns=None):
+    """Returns dataframe rows for plotting from either a dataframe or a GeneIndex
+    A dataframe of several rows is queried as well, so plotBars_*(gf, 'rho') plots rho and not the
+    first row; a single row is passed through untouched (already filtered, genes may be a title).
+    columns limits the columns read from a GeneIndex over a CachedDataset (see GeneIndex.rows)
+    """
+    if isinstance(data, GeneIndex):
+        if genes is None:
+            raise ValueError('a gene symbol or query is required when plotting from a GeneIndex')
+        if mode == 'exact':
+            return data.lookup(genes, columns)
+        return data.select(genes, mode=mode, columns=columns)
+    if genes is None or not isinstance(genes, str) or not hasattr(data, 'iloc') or data.shape[0] < 2:
+        return data
+    if mode == 'exact':
+        rows = data[data[findSymbolColumn(data)].astype(str) == genes]
+    else:
+        rows = GeneIndex(data).select(genes, mode=mode)
+    if rows.shape[0] == 0:
+        raise ValueError('{0!r} is not in the dataframe; pass its rows or a GeneIndex of the dataset'.format(genes))
+    return rows
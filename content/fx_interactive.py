@@ -0,0 +1,104 @@
+"""fx_interactive
+
+    Bar plot for interactive gene browsing (ipywidgets / ipympl)
+    The figure, axes and bars are built once; changing gene only updates bar heights,
+    y limits and title and asks the canvas for an idle redraw.
+        browser = BarBrowser('Hoang2020', zfH, 'rho')
+        browser.widget()        # text box; typing a symbol redraws the plot
+        browser.show('opn1sw1') # or update directly from code
+"""
+import asyncio
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from fx_geneIndex import GeneIndex
+from fx_layouts import getLayout
+from fx_RNAseqPlotters import plotBars_dataset
+from fx_timing import timed
+
+
+class BarBrowser:
+    """Persistent bar plot for one dataset layout that updates in place on gene change
+    Arguments:
+        layout          : DatasetLayout or its name (e.g. 'Angueyra2021', 'Hoang2020')
+        data            : pandas dataframe or GeneIndex of the dataset
+        geneSymbol      : gene shown first
+        ax              : pyplot axis handle (a new figure is created if not provided)
+        pC              : colors for plotting (default: layout colors)
+        pctPlot         : plot percent of cells expressing instead of average counts
+        figsize         : size of the new figure when ax is not provided
+        delay           : debounce delay (s) for request(); rapid requests only draw the last gene
+    """
+
+    def __init__(self, layout, data, geneSymbol, ax=None, pC=None, pctPlot=False, figsize=(8,6), delay=0.15):
+        self.layout = getLayout(layout)
+        self.index = data if isinstance(data, GeneIndex) else GeneIndex(data)
+        self.pctPlot = pctPlot
+        self.delay = delay
+        if not ax:
+            fig, ax = plt.subplots(figsize=figsize)
+        self.ax = ax
+        self.geneSymbol = None
+        self._pending = None
+        self._timer = None
+        self.bars = plotBars_dataset(self.layout, self._row(geneSymbol), geneSymbol, ax=ax, pC=pC, pctPlot=pctPlot)
+        self._setTitle(geneSymbol)
+        self.geneSymbol = geneSymbol
+        ax.figure.tight_layout()
+
+    def _row(self, geneSymbol):
+        rows = self.index.lookup(geneSymbol, self.layout.columns(self.pctPlot))
+        if rows.shape[0] == 0:
+            # genes that are not found are drawn as empty bars
+            return np.zeros(self.layout.columns(self.pctPlot).max() + 1)
+        return rows
+
+    def _values(self, geneSymbol):
+        return np.asarray(self.layout.values(self._row(geneSymbol), self.pctPlot), dtype=float)
+
+    def _setTitle(self, geneSymbol):
+        title = geneSymbol if geneSymbol in self.index else geneSymbol + ' (not found)'
+        # set_text keeps the title font set by defaultFonts
+        self.ax.title.set_text(title)
+
+    @timed('BarBrowser.show')
+    def show(self, geneSymbol):
+        """Updates the plot to geneSymbol immediately"""
+        h = self._values(geneSymbol)
+        for bar, value in zip(self.bars, h):
+            bar.set_height(value)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self._setTitle(geneSymbol)
+        self.geneSymbol = geneSymbol
+        self.ax.figure.canvas.draw_idle()
+
+    def request(self, geneSymbol):
+        """Debounced update: only the last gene requested within delay seconds is drawn
+        Without a running event loop (plain scripts) the plot is updated immediately.
+        """
+        self._pending = geneSymbol
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None or not self.delay:
+            self._flush()
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_later(self.delay, self._flush)
+
+    def _flush(self):
+        self._timer = None
+        geneSymbol, self._pending = self._pending, None
+        if geneSymbol is not None and geneSymbol != self.geneSymbol:
+            self.show(geneSymbol)
+
+    def widget(self, description='Gene symbol'):
+        """Text box (ipywidgets) linked to this plot"""
+        import ipywidgets
+        box = ipywidgets.Text(value=self.geneSymbol, description=description, continuous_update=True)
+        box.observe(lambda change: self.request(change['new'].strip()), names='value')
+        return box
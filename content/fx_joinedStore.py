@@ -0,0 +1,153 @@
+"""fx_joinedStore
+
+    Cross-dataset store aligning several expression tables on a canonical symbol key
+    Every dataset is held as one dense float32 matrix (full csv column layout, non-numeric
+    columns as NaN) with rows in a shared order, so one key lookup gives the vectors of all
+    datasets for the plotBars_* calls. Which source row each entry came from, symbols that
+    only match after canonicalization and duplicated symbols are recorded instead of being
+    dropped silently.
+        store = JoinedStore({'Angueyra2021': gf, 'Ogawa2021': zfO, 'Hoang2020': zfH, 'Sun2018': zfS})
+        vectors = store.vectors('rho')
+        plotBars(vectors['Angueyra2021'], 'rho')
+        plotBars_Hoang2020(vectors['Hoang2020'], 'rho', pctPlot=True)
+        store.report()
+"""
+from collections import Counter
+
+import numpy as np
+
+from fx_geneIndex import GeneIndex, findSymbolColumn
+
+
+def canonicalSymbol(symbol):
+    """Default join key: stripped, lower-case symbol"""
+    return str(symbol).strip().lower()
+
+
+def _tableArrays(source):
+    """Symbols and a float32 matrix (all columns, non-numeric as NaN) of a dataset"""
+    if isinstance(source, GeneIndex):
+        source = source.data
+    if hasattr(source, 'column'):
+        # CachedDataset
+        symbols = np.asarray(source.symbols)
+        matrix = np.full(source.shape, np.nan, dtype=np.float32)
+        for i, kind in enumerate(source.kinds):
+            if kind == 'numeric':
+                matrix[:, i] = source.column(i)
+        return symbols, matrix
+    import pandas as pd
+    symbols = source[findSymbolColumn(source)].to_numpy()
+    matrix = np.full(source.shape, np.nan, dtype=np.float32)
+    for i in range(source.shape[1]):
+        column = source.iloc[:, i]
+        if pd.api.types.is_numeric_dtype(column.dtype):
+            matrix[:, i] = column.to_numpy(dtype=np.float32)
+    return symbols, matrix
+
+
+class JoinedStore:
+    """Expression matrices of several datasets in a shared, symbol-keyed row order
+    Arguments:
+        datasets        : dict of dataset (layout) name -> dataframe, CachedDataset or GeneIndex
+        canonical       : function mapping a symbol to its join key (default: canonicalSymbol)
+    Attributes:
+        keys            : join keys, sorted; row i of every matrix belongs to keys[i]
+        matrices        : dict name -> C-contiguous float32 array (keys x csv columns), NaN where missing
+        sourceRows      : dict name -> row of the source table used for each key (-1 if missing)
+        sourceSymbols   : dict name -> symbol as written in the source table ('' if missing)
+        duplicates      : dict name -> {key: all source rows with that key}; the first row is used
+    """
+
+    def __init__(self, datasets, canonical=canonicalSymbol):
+        self.canonical = canonical
+        tables = {}
+        for name, source in datasets.items():
+            symbols, matrix = _tableArrays(source)
+            tables[name] = ([canonical(s) for s in symbols], symbols, matrix)
+        self.keys = np.array(sorted(set().union(*[keys for keys, _, _ in tables.values()])), dtype=object)
+        self.keyIndex = dict(zip(self.keys.tolist(), range(len(self.keys))))
+        self.matrices = {}
+        self.sourceRows = {}
+        self.sourceSymbols = {}
+        self.duplicates = {}
+        for name, (keys, symbols, matrix) in tables.items():
+            # first occurrence of each key (later duplicates are kept in self.duplicates)
+            first = dict(zip(reversed(keys), range(len(keys) - 1, -1, -1)))
+            duplicated = {k for k, n in Counter(keys).items() if n > 1}
+            dups = {}
+            for i, k in enumerate(keys):
+                if k in duplicated:
+                    dups.setdefault(k, []).append(i)
+            self.duplicates[name] = {k: np.array(rows, dtype=np.intp) for k, rows in dups.items()}
+            storeRows = np.fromiter((self.keyIndex[k] for k in first), dtype=np.intp, count=len(first))
+            tableRows = np.fromiter(first.values(), dtype=np.intp, count=len(first))
+            sourceRows = np.full(len(self.keys), -1, dtype=np.intp)
+            sourceRows[storeRows] = tableRows
+            aligned = np.full((len(self.keys), matrix.shape[1]), np.nan, dtype=np.float32)
+            aligned[storeRows] = matrix[tableRows]
+            sourceSymbols = np.full(len(self.keys), '', dtype=object)
+            sourceSymbols[storeRows] = np.asarray(symbols, dtype=object)[tableRows]
+            self.matrices[name] = np.ascontiguousarray(aligned)
+            self.sourceRows[name] = sourceRows
+            self.sourceSymbols[name] = sourceSymbols
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, symbol):
+        return self.canonical(symbol) in self.keyIndex
+
+    @property
+    def names(self):
+        return list(self.matrices)
+
+    def row(self, symbol):
+        """Shared row of a symbol (None if no dataset has it)"""
+        return self.keyIndex.get(self.canonical(symbol))
+
+    def vectors(self, symbol):
+        """Full csv-layout row of every dataset for a symbol (None for datasets without it)
+        The rows can be passed as barData to plotBars_* / plotBars_dataset.
+        """
+        i = self.row(symbol)
+        if i is None:
+            return {name: None for name in self.matrices}
+        return {name: (self.matrices[name][i] if self.sourceRows[name][i] >= 0 else None) for name in self.matrices}
+
+    def barData(self, symbol, name):
+        """Full csv-layout row of one dataset for a symbol (None if missing)"""
+        return self.vectors(symbol)[name]
+
+    def provenance(self, symbol):
+        """Source row, source symbol and duplicate rows of a symbol in every dataset"""
+        i = self.row(symbol)
+        key = self.canonical(symbol)
+        info = {}
+        for name in self.matrices:
+            found = i is not None and self.sourceRows[name][i] >= 0
+            info[name] = {
+                'row': int(self.sourceRows[name][i]) if found else None,
+                'symbol': self.sourceSymbols[name][i] if found else None,
+                'duplicateRows': self.duplicates[name].get(key, np.empty(0, dtype=np.intp)).tolist(),
+            }
+        return info
+
+    def report(self):
+        """Dataframe summarizing coverage, duplicated symbols and symbols changed by canonicalization"""
+        import pandas as pd
+        rows = []
+        for name in self.matrices:
+            present = self.sourceRows[name] >= 0
+            renamed = present & (self.sourceSymbols[name] != self.keys)
+            others = [self.sourceRows[o] >= 0 for o in self.matrices if o != name]
+            onlyHere = present & ~np.any(others, axis=0) if others else present
+            rows.append({
+                'dataset': name,
+                'genes': int(present.sum()),
+                'duplicated symbols': len(self.duplicates[name]),
+                'rows dropped as duplicates': int(sum(len(r) - 1 for r in self.duplicates[name].values())),
+                'symbols matched after canonicalization': int(renamed.sum()),
+                'genes only in this dataset': int(onlyHere.sum()),
+            })
+        return pd.DataFrame(rows).set_index('dataset')
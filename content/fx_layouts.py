@@ -0,0 +1,228 @@
+"""fx_layouts
+
+    Registry of dataset layouts used by the plotBars_* and heatmap_* families
+    A layout describes where the values of a dataset sit in its csv (value and pct columns),
+    how they are grouped into cell types, their colors, tick labels and units. Each layout
+    is compiled once into integer column indices, bar positions and color arrays, so
+    plotting a gene is an array gather. New datasets only need a registerLayout call:
+        registerLayout(DatasetLayout('myData', groups=[('Rods', 3, 'r'), ('UV', 3, 'u')],
+            valueStart=2, units='cpm'))
+        plotBars_dataset('myData', myDataFrame, 'rho')
+"""
+import numpy as np
+
+# default colors
+photoreceptorColors = {'r' : '#747474','u' : '#B540B7','s' : '#4669F2','m' : '#04CD22','l' : '#CC2C2A',
+    'm4': '#cdcd04','onBC': '#ccf2ff','offBC': '#663d00'}
+
+retinaColors = {
+    'RPC' : '#DADADA', # Retinal progenitor cell
+    'PRPC' : '#dfdac8', # Photoreceptor progenitor cell
+    'Cones_larval' : '#dcc360', #
+    'Cones_adult' : '#ffd429', #
+    'Rods' : '#7d7d7d', #
+    'HC' : '#FC7715', # Horizontal cells
+    'BC_larval' : '#ccf2ff', # Bipolar cell (developing)
+    'BC_adult' : '#663d00', # Bipolar cell (mature)
+    'AC_larval' : '#3DF591', # Amacrine cell (developing)
+    'ACgaba' : '#3DF5C3', #
+    'ACgly' : '#56F53D', #
+    'RGC_larval' : '#F53D59', # Retinal Ganglion cell (developing)
+    'RGC_adult' : '#BB0622', # Retinal Ganglion cell (mature)
+    'MGi' : '#EA9D81', # Muller glia (immature)
+    'MG1' : '#A2644E', # Muller glia (mature)
+    'MG2' : '#7E4835', # Muller glia (mature)
+    'MG3' : '#613728', # Muller glia (mature)
+}
+
+photoreceptorDevColors = {
+    'PRP' : "#dfdac8",
+    'eslPR' : '#dacd9a',
+    'mslPR' : '#dcc360',
+    'lslPR' : '#cca819',
+    'adPR' : '#ffd429',
+    'lslR' : '#a3a3a3',
+    'r' : '#7d7d7d',
+    'u' : '#B540B7',
+    's' : '#4669F2',
+    'm' : '#04CD22',
+    'l' : '#CC2C2A',
+}
+
+retina42hpfColors = {'RPC' : '#DADADA', 'PR' : '#dcc360', 'HC_AC' : '#3DF591', 'RGC' : '#F53D59'}
+
+horizontalCellColors = {'lHC' : '#fdbb8a', 'HC1' : '#FC7715', 'HC2' : '#d05a04', 'HC3' : '#9c4403', 'HCx' : '#6b2f02'}
+
+
+class DatasetLayout:
+    """Column layout and plotting style of a dataset
+    Arguments:
+        name            : registry key (e.g. 'Hoang2020')
+        groups          : list of (label, number of columns, color key) for each cell type, in csv order
+        valueStart      : position of the first value column in the csv
+        units           : y label of bar plots
+        cbarUnits       : colorbar label of heatmaps (default: units)
+        pctStart        : position of the first percent-expressing column (None if absent)
+        pctUnits        : y label of bar plots with pctPlot=True
+        pctCbarUnits    : colorbar label of heatmaps with pctPlot=True
+        normUnits       : units used in the colorbar label of normalized heatmaps (default: cbarUnits)
+        heatmapLabels   : group labels for heatmaps if different from the bar plot tick labels
+        colors          : default color dict (pC)
+        barStart        : x position of the first bar
+        barGap          : extra space between groups of bars
+        tickMode        : 'groups' (one tick per group) or 'bars' (one tick per bar)
+        tickRotation    : None, 45 (rotated in place) or 'anchor' (rotated and right-aligned to the tick)
+        minorTicks      : add a minor tick under every bar
+        reference       : citation shown in docstrings and figure annotations
+    """
+
+    def __init__(self, name, groups, valueStart, units, cbarUnits=None, pctStart=None,
+            pctUnits='% expressing', pctCbarUnits='%', normUnits=None, heatmapLabels=None,
+            colors=None, barStart=1, barGap=0, tickMode='bars', tickRotation=None,
+            minorTicks=False, reference=''):
+        self.name = name
+        self.groups = list(groups)
+        self.units = units
+        self.cbarUnits = units if cbarUnits is None else cbarUnits
+        self.pctUnits = pctUnits
+        self.pctCbarUnits = pctCbarUnits
+        self.normUnits = normUnits
+        self.colors = photoreceptorColors if colors is None else colors
+        self.tickMode = tickMode
+        self.tickRotation = tickRotation
+        self.minorTicks = minorTicks
+        self.reference = reference
+        # compiled arrays
+        self.groupsN = np.array([n for _, n, _ in self.groups])
+        self.groupsLabels = np.array([label for label, _, _ in self.groups])
+        self.heatmapLabels = self.groupsLabels if heatmapLabels is None else np.array(heatmapLabels)
+        self.groupsColorKeys = [key for _, _, key in self.groups]
+        self.barColorKeys = [key for _, n, key in self.groups for i in range(n)]
+        self.nValues = int(self.groupsN.sum())
+        self.valueColumns = valueStart + np.arange(self.nValues)
+        self.pctColumns = None if pctStart is None else pctStart + np.arange(self.nValues)
+        groupStarts = barStart + np.concatenate([[0], np.cumsum(self.groupsN + barGap)[:-1]])
+        self.x = np.concatenate([s + np.arange(n) for s, n in zip(groupStarts, self.groupsN)]).astype(float)
+        if tickMode == 'groups':
+            self.ticks = groupStarts + (self.groupsN - 1) / 2
+            self.tickLabels = self.groupsLabels
+        else:
+            self.ticks = self.x
+            self.tickLabels = np.repeat(self.groupsLabels, self.groupsN)
+        self._colorCache = {}
+
+    def __repr__(self):
+        return 'DatasetLayout({0!r}, {1} values in {2} groups)'.format(self.name, self.nValues, len(self.groups))
+
+    def columns(self, pctPlot=False):
+        """Integer positions of the plotted columns"""
+        if pctPlot:
+            if self.pctColumns is None:
+                raise ValueError('{0} has no percent-expressing columns'.format(self.name))
+            return self.pctColumns
+        return self.valueColumns
+
+    def columnRange(self, pctPlot=False):
+        """(start, end) of the plotted columns, as used with iloc"""
+        columns = self.columns(pctPlot)
+        return int(columns[0]), int(columns[-1]) + 1
+
+    def _colorArray(self, keys, pC):
+        if not pC:
+            pC = self.colors
+        colors = tuple(pC[k] for k in dict.fromkeys(keys))
+        cacheKey = (tuple(keys), colors)
+        if cacheKey not in self._colorCache:
+            self._colorCache[cacheKey] = np.array([pC[k] for k in keys])
+        return self._colorCache[cacheKey]
+
+    def barColors(self, pC=None):
+        """Color of each bar for a color dict (default colors if pC is None)"""
+        return self._colorArray(self.barColorKeys, pC)
+
+    def groupsColors(self, pC=None):
+        """Color of each group for a color dict (default colors if pC is None)"""
+        return self._colorArray(self.groupsColorKeys, pC)
+
+    def values(self, data, pctPlot=False):
+        """Plotted values of the first gene in data
+        Arguments:
+            data        : dataframe rows in the csv column layout, or a 1D array holding a full csv row
+        """
+        columns = self.columns(pctPlot)
+        if hasattr(data, 'iloc'):
+            return data.iloc[0, columns].to_numpy()
+        return np.asarray(data)[columns]
+
+
+datasetLayouts = {}
+
+
+def registerLayout(layout):
+    """Adds (or replaces) a dataset layout in the registry"""
+    datasetLayouts[layout.name] = layout
+    return layout
+
+
+def getLayout(layout):
+    """Returns a registered layout by name (layouts are passed through)"""
+    if isinstance(layout, DatasetLayout):
+        return layout
+    try:
+        return datasetLayouts[layout]
+    except KeyError:
+        raise KeyError('unknown dataset layout {0!r}; registered layouts are {1}'.format(layout, sorted(datasetLayouts))) from None
+
+
+registerLayout(DatasetLayout('Angueyra2021',
+    groups=[('Rods', 6, 'r'), ('UV', 5, 'u'), ('S', 6, 's'), ('M', 7, 'm'), ('L', 6, 'l')],
+    valueStart=7, units='FPKM', barGap=1, tickMode='groups',
+    reference='Angueyra et al. (2021)'))
+
+registerLayout(DatasetLayout('Ogawa2021',
+    groups=[('Rods', 1, 'r'), ('UV', 1, 'u'), ('S', 1, 's'), ('M', 1, 'm'), ('L', 1, 'l'), ('M4', 1, 'm4'),
+        ('BC$_{on}$', 1, 'onBC'), ('BC$_{off}$', 1, 'offBC')],
+    heatmapLabels=['Rods','UV','S','M','L', 'M4','B$_{on}$','B$_{off}$'],
+    valueStart=2, pctStart=11, units='avg. counts', cbarUnits='avg.', tickRotation=45,
+    reference='Ogawa and Corbo (2021)'))
+
+registerLayout(DatasetLayout('Hoang2020',
+    groups=[('Rods', 1, 'r'), ('UV', 1, 'u'), ('S', 1, 's'), ('M1', 1, 'm'), ('M3', 1, 'm'), ('M4', 1, 'm4'), ('L', 1, 'l')],
+    heatmapLabels=['Rods','UV','S','M','M3', 'M4','L'],
+    valueStart=2, pctStart=10, units='avg. counts', cbarUnits='avg.', tickRotation=45,
+    reference='Hoang et al. (2020)'))
+
+registerLayout(DatasetLayout('Hoang2020_Ret',
+    groups=[('RPC', 1, 'RPC'), ('PRPC', 1, 'PRPC'), ('C$_{larval}$', 1, 'Cones_larval'), ('C$_{adult}$', 1, 'Cones_adult'),
+        ('R$_{ods}$', 1, 'Rods'), ('HC', 1, 'HC'), ('BC$_{larval}$', 1, 'BC_larval'), ('BC$_{adult}$', 1, 'BC_adult'),
+        ('AC$_{larval}$', 1, 'AC_larval'), ('AC$_{GABA}$', 1, 'ACgaba'), ('AC$_{Gly}$', 1, 'ACgly'),
+        ('RGC$_{larval}$', 1, 'RGC_larval'), ('RGC$_{adult}$', 1, 'RGC_adult'),
+        ('MGi', 1, 'MGi'), ('MG1', 1, 'MG1'), ('MG2', 1, 'MG2'), ('MG3', 1, 'MG3')],
+    valueStart=2, pctStart=21, units='avg. counts', cbarUnits='avg.', colors=retinaColors, tickRotation='anchor',
+    reference='Hoang et al. (2020)'))
+
+registerLayout(DatasetLayout('Hoang2020_PRDev',
+    groups=[('PRPC', 1, 'PRP'), ('PR$_{larval-early}$', 1, 'eslPR'), ('PR$_{larval-mid}$', 1, 'mslPR'),
+        ('PR$_{larval-late}$', 1, 'lslPR'), ('PR$_{adult}$', 1, 'adPR'), ('Rod$_{larval-late}$', 1, 'lslR'),
+        ('Rod$_{adult}$', 1, 'r'), ('UV$_{adult}$', 1, 'u'), ('S$_{adult}$', 1, 's'), ('M$_{adult}$', 1, 'm'),
+        ('L$_{adult}$', 1, 'l')],
+    valueStart=2, pctStart=14, units='avg. counts', cbarUnits='avg.', colors=photoreceptorDevColors, tickRotation='anchor',
+    reference='Hoang et al. (2020)'))
+
+registerLayout(DatasetLayout('Hoang2020_HCs',
+    groups=[('lHC', 1, 'lHC'), ('HC1', 1, 'HC1'), ('HC2', 1, 'HC2'), ('HC3', 1, 'HC3'), ('HCx', 1, 'HCx')],
+    valueStart=2, pctStart=8, units='avg. counts', cbarUnits='avg.', colors=horizontalCellColors, tickRotation=45,
+    reference='Hoang et al. (2020)'))
+
+registerLayout(DatasetLayout('Sun2018',
+    groups=[('Rods', 4, 'r'), ('notRods', 4, 'm4')],
+    valueStart=7, units='cpm', barGap=1, tickMode='groups',
+    reference='Sun, Galicia and Stenkamp (2018)'))
+
+# normalized heatmaps are labelled 'norm. counts' (the original heatmap_Nerli2022 said 'norm. FPKM',
+# but the values are normalized counts, as its raw label says)
+registerLayout(DatasetLayout('Nerli2022',
+    groups=[('RPC', 5, 'RPC'), ('Photo', 5, 'PR'), ('HC/AC', 5, 'HC_AC'), ('RGC', 5, 'RGC')],
+    valueStart=1, units='counts (norm.)', cbarUnits='Counts (norm.)', normUnits='counts', colors=retina42hpfColors,
+    barStart=0, barGap=.5, tickMode='groups', minorTicks=True,
+    reference='Nerli et al. (2022)'))
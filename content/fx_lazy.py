@@ -0,0 +1,51 @@
+"""fx_lazy
+
+    Deferred imports for juanPlot
+    Importing the plotting module should not pay for matplotlib (or pandas) until a plot is
+    actually made; inside Pyodide these imports dominate time-to-first-plot.
+        plt = lazyModule('matplotlib.pyplot')   # imported on first attribute access
+"""
+import importlib
+import types
+
+
+class _LazyModule(types.ModuleType):
+    """Module placeholder that imports the real module on first attribute access"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__['_lazyTarget'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazyTarget']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__['_lazyTarget'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_lazyTarget'] is not None else 'not loaded'
+        return '<lazy module {0!r} ({1})>'.format(self.__name__, state)
+
+
+def lazyModule(name):
+    """Returns a placeholder for module name that is imported on first use"""
+    return _LazyModule(name)
+
+
+def lazyAttributes(moduleName, names, attr):
+    """Resolves attr from the module that provides it (for module-level __getattr__)
+    Arguments:
+        moduleName  : name of the calling module (for the error message)
+        names       : dict of attribute name -> providing module name
+        attr        : requested attribute
+    """
+    if attr not in names:
+        raise AttributeError('module {0!r} has no attribute {1!r}'.format(moduleName, attr))
+    return getattr(importlib.import_module(names[attr]), attr)
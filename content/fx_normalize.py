@@ -0,0 +1,111 @@
+"""fx_normalize
+
+    Row normalization modes for heatmaps, computed on whole matrices with numpy
+        'max'       : each row divided by its maximum (previous norm=True)
+        'zscore'    : each row centered and scaled to unit standard deviation
+        'log1p'     : log(1 + x)
+        'subtype'   : mean of each subtype (replicate group), divided by the row maximum
+    Rows that are all zero (or constant, for 'zscore') are returned as zeros instead of NaN.
+    Normalized matrices of a whole dataset are cached on its GeneIndex, so heatmaps of
+    thousands of genes slice precomputed values.
+"""
+import numpy as np
+
+from fx_timing import currentSpan, timed
+
+normModes = ('max', 'zscore', 'log1p', 'subtype')
+
+
+def normMode(norm):
+    """Maps the norm argument of heatmap_* to a mode (None for raw data); True means 'max'"""
+    if norm is None or norm is False:
+        return None
+    if norm is True:
+        return 'max'
+    if norm not in normModes:
+        raise ValueError('norm must be one of {0}, not {1!r}'.format(normModes, norm))
+    return norm
+
+
+def normLabel(norm, units):
+    """Colorbar label for a normalization mode"""
+    mode = normMode(norm)
+    if mode is None:
+        return units
+    if mode == 'max':
+        return 'norm. ' + units
+    if mode == 'zscore':
+        return 'z-score'
+    if mode == 'log1p':
+        return 'log(1+' + units + ')'
+    return 'norm. mean ' + units
+
+
+def _safeDivide(num, den):
+    out = np.zeros(np.broadcast(num, den).shape, dtype=np.result_type(num, den, np.float32))
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def groupMeans(data, groupsN):
+    """Mean of each group of consecutive columns (groupsN: number of columns per group)"""
+    groupsN = np.asarray(groupsN)
+    starts = np.concatenate([[0], np.cumsum(groupsN)[:-1]])
+    return np.add.reduceat(data, starts, axis=1) / groupsN
+
+
+def normalizeData(data, norm='max', groupsN=None):
+    """Normalizes a 2D array row-wise
+    Arguments:
+        data        : 2D numpy array (genes x samples)
+        norm        : normalization mode (see normModes); True is 'max', False/None returns data
+        groupsN     : number of columns per subtype, required for 'subtype'
+    Returns:
+        normalized 2D numpy array ('subtype' returns one column per group)
+    """
+    mode = normMode(norm)
+    data = np.asarray(data, dtype=float)
+    if mode is None:
+        return data
+    if data.shape[0] == 0:
+        if mode == 'subtype':
+            return np.zeros((0, len(groupsN)))
+        return data
+    if mode == 'max':
+        return _safeDivide(data, np.nanmax(data, axis=1, keepdims=True))
+    if mode == 'zscore':
+        mean = np.nanmean(data, axis=1, keepdims=True)
+        std = np.nanstd(data, axis=1, keepdims=True)
+        return _safeDivide(data - mean, std)
+    if mode == 'log1p':
+        return np.log1p(np.clip(data, 0, None))
+    if groupsN is None:
+        raise ValueError("norm='subtype' needs the number of columns per subtype (groupsN)")
+    means = groupMeans(data, groupsN)
+    return _safeDivide(means, np.nanmax(means, axis=1, keepdims=True))
+
+
+def columnBlock(source, columns):
+    """Columns (integer positions) of a whole dataset (dataframe or CachedDataset) as a float array"""
+    if hasattr(source, 'column'):
+        return np.column_stack([np.asarray(source.column(int(i)), dtype=float) for i in columns])
+    return source.iloc[:, columns].to_numpy(dtype=float)
+
+
+@timed()
+def normalizedDataset(geneIndex, columns, norm=None, groupsN=None):
+    """Normalized columns for every gene of an indexed dataset, cached on the GeneIndex
+    Arguments:
+        geneIndex   : GeneIndex of the dataset
+        columns     : integer positions of the columns (see DatasetLayout.columns)
+        norm        : normalization mode (see normalizeData)
+        groupsN     : number of columns per subtype
+    """
+    mode = normMode(norm)
+    key = ('norm', tuple(int(i) for i in columns), mode, None if groupsN is None else tuple(int(g) for g in groupsN))
+    cached = key in geneIndex.cache
+    if not cached:
+        raw = columnBlock(geneIndex.data, columns)
+        geneIndex.cache[key] = raw if mode is None else normalizeData(raw, mode, groupsN)
+    currentSpan().note(cached=cached, rows=geneIndex.cache[key].shape[0])
+    return geneIndex.cache[key]
@@ -0,0 +1,154 @@
+"""fx_overview
+
+    Whole-dataset overview heatmap with level of detail
+    Instead of one image row per gene, the visible genes are aggregated into about one bin per
+    pixel row (mean or max per bin) of the cached, normalized dataset matrix. Zooming or panning
+    (ipympl toolbar, or zoom()) recomputes the bins for the new range, and gene labels appear
+    once the visible genes fit as readable text. Image size and render time depend on the size
+    of the axes, not on the number of genes.
+        %matplotlib widget
+        ov = OverviewHeatmap('Hoang2020', gI, norm='max')
+        ov.zoom('opn1sw1', 40)      # 40 genes around opn1sw1
+"""
+import numpy as np
+
+from fx_geneIndex import GeneIndex
+from fx_layouts import getLayout
+from fx_lazy import lazyModule
+from fx_normalize import normalizedDataset, normLabel, normMode
+from fx_timing import currentSpan, timed
+
+plt = lazyModule('matplotlib.pyplot')
+
+binReducers = ('mean', 'max')
+# font size (points) of gene labels; labels are shown when rows are at least this tall
+labelSize = 10
+
+
+def binRows(data, nBins, reducer='mean'):
+    """Aggregates consecutive rows of data into nBins bins (fewer if there are fewer rows)
+    Returns:
+        binned      : 2D array (bins x columns)
+        edges       : row index where each bin starts, plus the end
+    """
+    if reducer not in binReducers:
+        raise ValueError('reducer must be one of {0}, not {1!r}'.format(binReducers, reducer))
+    nRows = data.shape[0]
+    nBins = max(1, min(int(nBins), nRows))
+    edges = np.linspace(0, nRows, nBins + 1).astype(np.intp)
+    if nBins == nRows:
+        return np.asarray(data, dtype=float), edges
+    starts = edges[:-1]
+    if reducer == 'max':
+        return np.maximum.reduceat(data, starts, axis=0), edges
+    return np.add.reduceat(data, starts, axis=0) / np.diff(edges)[:, None], edges
+
+
+class OverviewHeatmap:
+    """Heatmap of any number of genes that re-bins on zoom
+    Arguments:
+        layout      : DatasetLayout or its name (e.g. 'Hoang2020')
+        data        : GeneIndex (or dataframe / CachedDataset) of the dataset
+        ax          : pyplot axis handle (a new figure is created if not provided)
+        pctPlot     : plot percent of cells expressing instead of average counts
+        norm        : normalization mode (see fx_normalize); bins of 'max' rows stay within 0-1
+        genes       : optional gene query (see GeneIndex.query); default all genes
+        mode        : type of gene query
+        reducer     : 'mean' or 'max' per bin ('max' keeps isolated high rows visible)
+        order       : 'symbol' (alphabetical, as the notebook heatmaps) or None (csv order)
+        figsize     : size of the new figure when ax is not provided
+        cmap        : colormap
+    """
+
+    def __init__(self, layout, data, ax=None, pctPlot=False, norm='max', genes=None, mode='prefix',
+            reducer='mean', order='symbol', figsize=(6, 10), cmap='bone'):
+        self.layout = getLayout(layout)
+        self.index = data if isinstance(data, GeneIndex) else GeneIndex(data)
+        self.reducer = reducer
+        matrix = normalizedDataset(self.index, self.layout.columns(pctPlot), norm, self.layout.groupsN)
+        positions = np.arange(len(self.index)) if genes is None else self.index.query(genes, mode=mode)
+        if order == 'symbol':
+            positions = positions[np.argsort(self.index.symbols[positions], kind='stable')]
+        self.positions = positions
+        self.labels = self.index.symbols[positions]
+        self.matrix = matrix if genes is None and order is None else matrix[positions]
+        self.nRows = self.matrix.shape[0]
+        self.groupsN = np.ones(len(self.layout.groupsN), dtype=int) if normMode(norm) == 'subtype' else self.layout.groupsN
+        if not ax:
+            fig, ax = plt.subplots(figsize=figsize)
+        self.ax = ax
+        self.range = None
+        finite = self.matrix[np.isfinite(self.matrix)]
+        clim = (finite.min(), finite.max()) if finite.size else (0, 1)
+        self.image = ax.imshow(np.zeros((1, self.matrix.shape[1])), cmap=cmap, aspect='auto',
+            interpolation='nearest', vmin=clim[0], vmax=clim[1])
+        units = self.layout.pctCbarUnits if pctPlot else self.layout.cbarUnits
+        if normMode(norm) is not None:
+            units = normLabel(norm, self.layout.normUnits or units)
+        self.colorbar = ax.figure.colorbar(self.image, ax=ax, shrink=.5, pad=.02, label=units)
+        edges = np.concatenate([[0], np.cumsum(self.groupsN)]) - .5
+        ax.set_xticks((edges[:-1] + edges[1:]) / 2)
+        ax.set_xticklabels(self.layout.heatmapLabels)
+        ax.tick_params(top=True, bottom=False, labeltop=True, labelbottom=False)
+        ax.vlines(edges[1:-1], 0, 1, transform=ax.get_xaxis_transform(), color='white', linewidth=1)
+        ax.set_xlim(-.5, self.matrix.shape[1] - .5)
+        # limits only change by zoom/pan; the image must not autoscale them back
+        ax.set_autoscale_on(False)
+        ax.set_ylim(self.nRows - .5, -.5)
+        self.render()
+        ax.callbacks.connect('ylim_changed', lambda ax: self.render())
+
+    def visibleRows(self):
+        """(first, end) of the gene rows within the current y limits"""
+        bottom, top = self.ax.get_ylim()
+        lo, hi = min(bottom, top), max(bottom, top)
+        return max(0, int(np.floor(lo + .5))), min(self.nRows, int(np.ceil(hi + .5)))
+
+    def _pixelRows(self):
+        return max(1, int(self.ax.get_window_extent().height))
+
+    @timed('OverviewHeatmap.render')
+    def render(self, force=False):
+        """Re-bins the visible rows (called on every change of the y limits)"""
+        span = currentSpan()
+        first, end = self.visibleRows()
+        if end <= first:
+            return
+        nBins = self._pixelRows()
+        if not force and self.range == (first, end, nBins):
+            return
+        self.range = (first, end, nBins)
+        binned, edges = binRows(self.matrix[first:end], nBins, self.reducer)
+        span.mark('bin')
+        self.image.set_data(binned)
+        self.image.set_extent((-.5, self.matrix.shape[1] - .5, end - .5, first - .5))
+        self._labelRows(first, end)
+        span.mark('update')
+        if span:
+            span.note(rows=end - first, bins=binned.shape[0])
+        self.ax.figure.canvas.draw_idle()
+
+    def _labelRows(self, first, end):
+        rowHeight = self.ax.get_window_extent().height * 72 / self.ax.figure.dpi / max(end - first, 1)
+        ax = self.ax
+        if rowHeight >= labelSize:
+            ax.set_yticks(np.arange(first, end))
+            ax.set_yticklabels(self.labels[first:end], fontsize=labelSize)
+            ax.set_ylabel('')
+        else:
+            ax.set_yticks([])
+            ax.set_ylabel('genes {0}-{1} of {2} (zoom in for labels)'.format(first + 1, end, self.nRows))
+
+    def zoom(self, center, nRows=50):
+        """Shows nRows genes around a row position or gene symbol"""
+        if isinstance(center, str):
+            hits = np.flatnonzero(self.labels == center)
+            if hits.shape[0] == 0:
+                raise KeyError('{0!r} not found'.format(center))
+            center = int(hits[0])
+        first = int(np.clip(center - nRows // 2, 0, max(self.nRows - nRows, 0)))
+        self.ax.set_ylim(min(first + nRows, self.nRows) - .5, first - .5)
+
+    def reset(self):
+        """Shows all genes again"""
+        self.ax.set_ylim(self.nRows - .5, -.5)
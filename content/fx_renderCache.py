@@ -0,0 +1,220 @@
+"""fx_renderCache
+
+    LRU cache of rendered plots (PNG/SVG bytes) for the gene requests users repeat
+    Plots are keyed by dataset version, gene set and every option that changes the image
+    (pctPlot, norm, style, figure size, format, ...), plus renderVersion and the matplotlib
+    version, so stored images are not served after the plots change. A repeated request
+    returns the stored bytes without running matplotlib. Entries live in memory, bounded in
+    bytes. An optional disk tier, also bounded in bytes, keeps them across sessions.
+        cache = RenderCache(diskDir='data/.fxcache/renders')
+        cache.showBars('Hoang2020', gI, 'rho', pctPlot=True)        # displays in the notebook
+        png = cache.heatmap('Hoang2020', gI, 'opn', norm='max')     # bytes
+        cache.stats()
+"""
+import hashlib
+import io
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from fx_geneIndex import GeneIndex
+from fx_layouts import getLayout
+from fx_timing import currentSpan, timed
+
+# part of every key: bump when plotBars_*/heatmap_* or the dataset layouts change how images look
+renderVersion = 1
+
+def datasetVersion(data):
+    """Content hash identifying a dataset (dataframe, CachedDataset or GeneIndex)
+    Dataframes are hashed on every call, so one changed in place gets a new version. A GeneIndex
+    keeps its version like the rest of its index: rebuild it after changing its dataframe.
+    """
+    if isinstance(data, GeneIndex):
+        if 'version' not in data.cache:
+            data.cache['version'] = datasetVersion(data.data)
+        return data.cache['version']
+    if hasattr(data, 'version'):
+        return data.version
+    import pandas as pd
+    h = hashlib.sha1(repr(list(data.columns)).encode())
+    h.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def _keyPart(value):
+    """Hashable form of an option such as a style for plt.style.context (name, dict or list of
+    them) or a dict of colors"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _keyPart(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(_keyPart(v) for v in value)
+    try:
+        hash(value)
+    except TypeError:
+        # e.g. a cycler as axes.prop_cycle
+        return repr(value)
+    return value
+
+
+class RenderCache:
+    """Memory (and optional disk) LRU cache of rendered bar plots and heatmaps
+    Arguments:
+        maxBytes        : memory budget for stored images
+        diskDir         : directory of the disk tier (None: memory only)
+        diskBytes       : disk budget; least recently used files are deleted beyond it
+        fmt             : default image format ('png' or 'svg')
+        dpi             : default resolution of png images
+    """
+
+    def __init__(self, maxBytes=64 * 2**20, diskDir=None, diskBytes=512 * 2**20, fmt='png', dpi=100):
+        self.maxBytes = maxBytes
+        self.diskDir = diskDir
+        self.diskBytes = diskBytes
+        self.fmt = fmt
+        self.dpi = dpi
+        self._memory = OrderedDict()
+        self._memoryBytes = 0
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self._diskTotal = 0
+        if diskDir is not None:
+            os.makedirs(diskDir, exist_ok=True)
+            self._diskTotal = sum(entry.stat().st_size for entry in os.scandir(diskDir) if entry.is_file())
+
+    def _store(self, key, image):
+        self._memory[key] = image
+        self._memoryBytes += len(image)
+        while self._memoryBytes > self.maxBytes and len(self._memory) > 1:
+            _, old = self._memory.popitem(last=False)
+            self._memoryBytes -= len(old)
+
+    def _key(self, *parts):
+        from matplotlib import __version__ as matplotlibVersion
+        return (renderVersion, matplotlibVersion) + parts
+
+    def _diskPath(self, key, fmt):
+        return os.path.join(self.diskDir, hashlib.sha1(repr(key).encode()).hexdigest() + '.' + fmt)
+
+    def _diskWrite(self, path, image):
+        tmpPath = path + '.tmp'
+        with open(tmpPath, 'wb') as f:
+            f.write(image)
+        try:
+            # a rewritten file (e.g. written by another session meanwhile) is counted once
+            self._diskTotal -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        os.replace(tmpPath, path)
+        self._diskTotal += len(image)
+        if self._diskTotal > self.diskBytes:
+            # least recently used first (hits refresh the modification time)
+            entries = sorted((e for e in os.scandir(self.diskDir) if e.is_file()), key=lambda e: e.stat().st_mtime)
+            for entry in entries:
+                if self._diskTotal <= self.diskBytes or entry.path == path:
+                    continue
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._diskTotal -= size
+
+    def get(self, key, render, fmt):
+        """Image bytes for key, calling render() on a miss"""
+        span = currentSpan()
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            span.note(cache='memory')
+            return self._memory[key]
+        path = self._diskPath(key, fmt) if self.diskDir is not None else None
+        if path is not None and os.path.exists(path):
+            with open(path, 'rb') as f:
+                image = f.read()
+            os.utime(path)
+            self.diskHits += 1
+            self._store(key, image)
+            span.note(cache='disk')
+            return image
+        self.misses += 1
+        image = render()
+        self._store(key, image)
+        if path is not None:
+            self._diskWrite(path, image)
+        span.note(cache='miss')
+        return image
+
+    def _render(self, draw, figsize, style, fmt, dpi):
+        import matplotlib.pyplot as plt
+        from matplotlib.figure import Figure
+        def render():
+            with plt.style.context(style or []):
+                # a standalone figure: nothing is added to pyplot's figure list
+                fig = Figure(figsize=figsize)
+                ax = fig.subplots()
+                draw(ax)
+                fig.tight_layout()
+                buffer = io.BytesIO()
+                fig.savefig(buffer, format=fmt, dpi=dpi)
+            return buffer.getvalue()
+        return render
+
+    @timed('RenderCache.bars')
+    def bars(self, layout, data, geneSymbol, pctPlot=False, pC=None, style=None, figsize=(8, 6), fmt=None, dpi=None):
+        """Bar plot image (bytes) of one gene, see plotBars_dataset"""
+        from fx_RNAseqPlotters import plotBars_dataset
+        layout = getLayout(layout)
+        fmt, dpi = fmt or self.fmt, dpi or self.dpi
+        colors = _keyPart(pC)
+        key = self._key('bars', layout.name, datasetVersion(data), geneSymbol, pctPlot, colors, _keyPart(style), tuple(figsize), fmt, dpi)
+        draw = lambda ax: plotBars_dataset(layout, data, geneSymbol, ax=ax, pC=pC, pctPlot=pctPlot)
+        return self.get(key, self._render(draw, figsize, style, fmt, dpi), fmt)
+
+    @timed('RenderCache.heatmap')
+    def heatmap(self, layout, data, genes=None, mode='prefix', pctPlot=False, norm=False, order=None, pC=None,
+            style=None, figsize=(10, 20), fmt=None, dpi=None):
+        """Heatmap image (bytes), see heatmap_dataset"""
+        from fx_RNAseqPlotters import heatmap_dataset
+        layout = getLayout(layout)
+        fmt, dpi = fmt or self.fmt, dpi or self.dpi
+        colors = _keyPart(pC)
+        geneSet = genes if genes is None or isinstance(genes, str) else tuple(genes)
+        key = self._key('heatmap', layout.name, datasetVersion(data), geneSet, mode, pctPlot, norm, order, colors, _keyPart(style),
+            tuple(figsize), fmt, dpi)
+        draw = lambda ax: heatmap_dataset(layout, data, ax=ax, pC=pC, pctPlot=pctPlot, norm=norm, genes=genes,
+            mode=mode, order=order)
+        return self.get(key, self._render(draw, figsize, style, fmt, dpi), fmt)
+
+    def _display(self, image, fmt):
+        from IPython.display import SVG, Image
+        return SVG(image) if fmt == 'svg' else Image(image)
+
+    def showBars(self, layout, data, geneSymbol, **kwargs):
+        """Bar plot as a notebook image"""
+        return self._display(self.bars(layout, data, geneSymbol, **kwargs), kwargs.get('fmt') or self.fmt)
+
+    def showHeatmap(self, layout, data, genes=None, **kwargs):
+        """Heatmap as a notebook image"""
+        return self._display(self.heatmap(layout, data, genes, **kwargs), kwargs.get('fmt') or self.fmt)
+
+    def stats(self):
+        """Hit/miss counts and sizes of both tiers"""
+        requests = self.hits + self.diskHits + self.misses
+        return {
+            'hits': self.hits,
+            'diskHits': self.diskHits,
+            'misses': self.misses,
+            'hitRate': (self.hits + self.diskHits) / requests if requests else np.nan,
+            'memoryItems': len(self._memory),
+            'memoryBytes': self._memoryBytes,
+            'diskBytes': self._diskTotal,
+        }
+
+    def clear(self, disk=False):
+        """Empties the memory tier (and the disk tier if disk=True)"""
+        self._memory.clear()
+        self._memoryBytes = 0
+        if disk and self.diskDir is not None:
+            for entry in os.scandir(self.diskDir):
+                if entry.is_file():
+                    os.remove(entry.path)
+            self._diskTotal = 0
@@ -0,0 +1,326 @@
+"""fx_shards
+
+    Sharded static export of the datasets, for fetching genes on demand in the browser explorer
+    exportShards sorts a dataset by gene symbol and writes it as small compressed .npz shards of
+    consecutive symbols (prefix buckets; shardRows=1 gives one shard per gene), plus index.json
+    with the column layout and the first symbol of every shard. ShardedDataset reads the index,
+    fetches only the shards holding the requested genes (concurrently, see fx_asyncLoad.fetchBytes)
+    and keeps them in memory. Rows come back as a dataframe with the columns of the csv, so
+    plotBars_* and heatmap_* use them unchanged.
+        exportShards('data/Hoang2020_10x_photoreceptors.csv', 'data/shards/Hoang2020')
+        zfH = await ShardedDataset(baseURL + 'shards/Hoang2020/').open()
+        plotBars_Hoang2020(await zfH.genes(['rho']), 'rho')
+        heatmap_Hoang2020(await zfH.query('opn1'))   # a dataframe is plotted as it is: query already picked the genes
+    The first plot costs the index plus one shard, whatever the size of the dataset. Try it locally with
+        python fx_shards.py             # exports content/data, serves it over http and times the first plot
+"""
+import asyncio
+import io
+import json
+import os
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+import numpy as np
+
+from fx_asyncLoad import fetchBytes
+from fx_compact import plottedColumns
+from fx_dataCache import narrowDtype
+from fx_geneIndex import findSymbolColumn
+from fx_timing import currentSpan, timed
+
+SHARD_VERSION = 1
+_indexName = 'index.json'
+
+
+def _shardName(k):
+    return 'shard{0:05d}.npz'.format(k)
+
+
+@timed()
+def exportShards(source, outDir, layouts=None, shardRows=64, verbose=True):
+    """Writes a dataset as a symbol index plus compressed binary shards of consecutive symbols
+    Arguments:
+        source      : csv path or dataframe
+        outDir      : output directory (previous shards in it are replaced)
+        layouts     : optional layout name(s); columns no plot of these layouts reads are not
+                      exported and are read back as NaN, keeping the column positions
+        shardRows   : genes per shard (1: one shard per gene)
+        verbose     : print the number and size of the shards
+    Returns:
+        the index (also written to outDir/index.json)
+    """
+    import pandas as pd
+    span = currentSpan()
+    data = pd.read_csv(source) if isinstance(source, str) else source
+    symbolColumn = findSymbolColumn(data)
+    symbolPosition = list(data.columns).index(symbolColumn)
+    symbols = [str(s) for s in data[symbolColumn].to_numpy()]
+    # same order as GeneIndex prefix queries: sorted by symbol, duplicates in file order
+    order = np.array(sorted(range(len(symbols)), key=symbols.__getitem__), dtype=np.intp)
+    sortedSymbols = np.array(symbols, dtype=str)[order]
+    kept = None
+    if layouts is not None:
+        if isinstance(layouts, str) or not hasattr(layouts, '__iter__'):
+            layouts = [layouts]
+        kept = plottedColumns(layouts)
+    kinds = []
+    numeric, strings = [], []
+    for i, name in enumerate(data.columns):
+        if i == symbolPosition:
+            kinds.append('symbol')
+        elif kept is not None and i not in kept:
+            kinds.append('dropped')
+        elif pd.api.types.is_numeric_dtype(data[name].dtype):
+            kinds.append('numeric')
+            numeric.append(i)
+        else:
+            kinds.append('string')
+            strings.append(i)
+    values = data.iloc[:, numeric].to_numpy(dtype=np.float64)
+    # one matrix per shard: float32 unless a column would lose values
+    dtype = np.float64 if any(narrowDtype(values[:, j]) == np.float64 for j in range(len(numeric))) else np.float32
+    values = values[order].astype(dtype)
+    stringValues = {}
+    for i in strings:
+        column = data.iloc[:, i]
+        stringValues[i] = (column.fillna('').astype(str).to_numpy().astype(str)[order], column.isna().to_numpy()[order])
+    span.mark('prepare')
+    os.makedirs(outDir, exist_ok=True)
+    for entry in os.scandir(outDir):
+        if entry.name.startswith('shard') and entry.name.endswith('.npz'):
+            os.remove(entry.path)
+    first, sizes = [], []
+    for k, start in enumerate(range(0, len(symbols), shardRows)):
+        stop = min(start + shardRows, len(symbols))
+        arrays = {'rows': order[start:stop].astype(np.int32), 'symbols': sortedSymbols[start:stop],
+            'values': values[start:stop]}
+        for i, (text, missing) in stringValues.items():
+            arrays['s{0}'.format(i)] = text[start:stop]
+            if missing[start:stop].any():
+                arrays['s{0}na'.format(i)] = missing[start:stop]
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        with open(os.path.join(outDir, _shardName(k)), 'wb') as f:
+            f.write(buffer.getvalue())
+        first.append(str(sortedSymbols[start]))
+        sizes.append(len(buffer.getvalue()))
+    span.mark('write')
+    index = {
+        'version': SHARD_VERSION,
+        'source': os.path.basename(source) if isinstance(source, str) else None,
+        'nRows': len(symbols),
+        'columns': [str(c) for c in data.columns],
+        'kinds': kinds,
+        'dtype': np.dtype(dtype).name,
+        'shardRows': shardRows,
+        'first': first,
+        'sizes': sizes,
+    }
+    # index is written last so an interrupted export is never mistaken for a complete one
+    tmpPath = os.path.join(outDir, _indexName + '.tmp')
+    with open(tmpPath, 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+    os.replace(tmpPath, os.path.join(outDir, _indexName))
+    if verbose:
+        print('\t {0}: {1} shards, {2:.2f} MB (index {3:.1f} kB, mean shard {4:.1f} kB)'.format(
+            index['source'] or outDir, len(first), sum(sizes) / 2**20,
+            os.path.getsize(os.path.join(outDir, _indexName)) / 2**10, np.mean(sizes) / 2**10 if sizes else 0))
+    if span:
+        span.note(rows=len(symbols), shards=len(first))
+    return index
+
+
+class ShardedDataset:
+    """Reader of an exported dataset that fetches and caches only the shards a query touches
+    Arguments:
+        baseURL     : URL or local directory of the export (the directory holding index.json)
+        maxShards   : shards kept in memory (least recently used are dropped); None keeps all
+    Attributes:
+        index       : parsed index.json (after open)
+        fetched     : number of shards downloaded so far
+        fetchedBytes: bytes downloaded so far (shards and index)
+    """
+
+    def __init__(self, baseURL, maxShards=None):
+        self.baseURL = baseURL if baseURL.endswith('/') else baseURL + '/'
+        self.maxShards = maxShards
+        self.index = None
+        self._shards = OrderedDict()
+        self.fetched = 0
+        self.fetchedBytes = 0
+
+    async def open(self):
+        """Fetches the index; returns self (zfH = await ShardedDataset(url).open())"""
+        if self.index is None:
+            data = await fetchBytes(self.baseURL + _indexName)
+            self.fetchedBytes += len(data)
+            index = json.loads(data.decode())
+            if index.get('version') != SHARD_VERSION:
+                raise ValueError('{0}: shard version {1}, expected {2}'.format(
+                    self.baseURL, index.get('version'), SHARD_VERSION))
+            self.index = index
+        return self
+
+    @property
+    def columns(self):
+        return self.index['columns']
+
+    def __len__(self):
+        return self.index['nRows']
+
+    def shardRange(self, symbol, prefix=False):
+        """(first, end) of the shards that can hold a symbol (or all symbols starting with it)"""
+        first = self.index['first']
+        # the shard before the first shard starting with symbol can still hold it (or its duplicates)
+        lo = max(bisect_left(first, symbol) - 1, 0)
+        hi = bisect_left(first, symbol + '\U0010ffff') if prefix else bisect_right(first, symbol)
+        return lo, max(hi, lo + 1) if first else 0
+
+    async def _fetchShard(self, k):
+        data = await fetchBytes(self.baseURL + _shardName(k))
+        self.fetched += 1
+        self.fetchedBytes += len(data)
+        with np.load(io.BytesIO(data), allow_pickle=False) as stored:
+            return {name: stored[name] for name in stored.files}
+
+    async def shard(self, k):
+        """Arrays of shard k, fetched on first use (concurrent requests share one download)"""
+        if k in self._shards:
+            self._shards.move_to_end(k)
+            return await self._shards[k]
+        task = asyncio.ensure_future(self._fetchShard(k))
+        self._shards[k] = task
+        if self.maxShards is not None:
+            while len(self._shards) > self.maxShards:
+                self._shards.popitem(last=False)
+        try:
+            return await task
+        except Exception:
+            self._shards.pop(k, None)
+            raise
+
+    async def _shardsFor(self, ranges):
+        wanted = sorted({k for lo, hi in ranges for k in range(lo, hi)})
+        return await asyncio.gather(*(self.shard(k) for k in wanted))
+
+    def _frame(self, parts, keep):
+        """Dataframe with the csv column layout from the rows of several shards selected by keep(symbols)"""
+        import pandas as pd
+        selected = []
+        for arrays in parts:
+            mask = keep(arrays['symbols'])
+            if mask.any():
+                selected.append((arrays, mask))
+        columns = {}
+        rows = np.concatenate([a['rows'][m] for a, m in selected]) if selected else np.empty(0, dtype=np.int32)
+        numeric = 0
+        for i, (name, kind) in enumerate(zip(self.index['columns'], self.index['kinds'])):
+            if kind == 'symbol':
+                values = np.concatenate([a['symbols'][m] for a, m in selected]) if selected else np.empty(0, dtype=str)
+                columns[name] = values.astype(object)
+            elif kind == 'numeric':
+                j = numeric
+                columns[name] = (np.concatenate([a['values'][m, j] for a, m in selected]) if selected
+                    else np.empty(0, dtype=self.index['dtype']))
+                numeric += 1
+            elif kind == 'string':
+                key = 's{0}'.format(i)
+                values = []
+                for a, m in selected:
+                    text = a[key][m].astype(object)
+                    if key + 'na' in a:
+                        text[a[key + 'na'][m]] = np.nan
+                    values.append(text)
+                columns[name] = np.concatenate(values) if values else np.empty(0, dtype=object)
+            else:
+                columns[name] = np.full(rows.shape[0], np.nan, dtype=np.float32)
+        return pd.DataFrame(columns, index=rows)
+
+    async def genes(self, symbols):
+        """Rows of a list of gene symbols (exact matches, in the order given; missing genes are skipped)"""
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        await self.open()
+        symbols = list(symbols)
+        parts = await self._shardsFor([self.shardRange(s) for s in symbols])
+        frame = self._frame(parts, lambda names: np.isin(names, symbols))
+        rank = {s: i for i, s in reversed(list(enumerate(symbols)))}
+        order = np.argsort([rank[s] for s in frame.iloc[:, self.index['kinds'].index('symbol')]], kind='stable')
+        return frame.iloc[order]
+
+    async def query(self, query, mode='prefix'):
+        """Rows matching a gene query, sorted by symbol
+        Arguments:
+            query   : symbol prefix (mode='prefix'), symbol (mode='exact') or list of symbols
+            mode    : 'prefix' or 'exact'
+        """
+        if not isinstance(query, str):
+            return await self.genes(query)
+        if mode == 'exact':
+            return await self.genes([query])
+        if mode != 'prefix':
+            raise ValueError("ShardedDataset queries are 'prefix' or 'exact', not {0!r}".format(mode))
+        await self.open()
+        parts = await self._shardsFor([self.shardRange(query, prefix=True)])
+        return self._frame(parts, lambda names: np.char.startswith(names, query))
+
+    async def toFrame(self):
+        """All rows (fetches every shard), in csv order"""
+        await self.open()
+        parts = await self._shardsFor([(0, len(self.index['first']))])
+        return self._frame(parts, lambda names: np.ones(names.shape[0], dtype=bool)).sort_index()
+
+    def clear(self):
+        """Drops the cached shards"""
+        self._shards.clear()
+
+
+def _demo(delay=0.):
+    """Exports content/data to a temporary directory, serves both over http and compares the
+    time to the first bar plot from the shards with downloading the whole csv"""
+    import shutil
+    import tempfile
+    import time
+    import matplotlib
+    matplotlib.use('Agg')
+    from fx_asyncLoad import readCsv, staticServer
+    from fx_timing import drawFigure
+    from fx_geneIndex import GeneIndex
+    from fx_RNAseqPlotters import plotBars_Hoang2020
+    dataDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    csvName = 'Hoang2020_10x_photoreceptors.csv'
+    outDir = tempfile.mkdtemp()
+    try:
+        exportShards(os.path.join(dataDir, csvName), os.path.join(outDir, 'Hoang2020'))
+        shutil.copy(os.path.join(dataDir, csvName), outDir)
+        server, baseURL = staticServer(outDir, delay)
+
+        async def run():
+            start = time.perf_counter()
+            frame = readCsv(await fetchBytes(baseURL + csvName))
+            plotBars_Hoang2020(GeneIndex(frame), 'rho')
+            drawFigure()
+            print('full csv: first plot after {0:.2f} s'.format(time.perf_counter() - start))
+            start = time.perf_counter()
+            zfH = await ShardedDataset(baseURL + 'Hoang2020/').open()
+            plotBars_Hoang2020(await zfH.genes(['rho']), 'rho')
+            drawFigure()
+            print('shards: first plot after {0:.2f} s ({1} shard, {2:.1f} kB)'.format(
+                time.perf_counter() - start, zfH.fetched, zfH.fetchedBytes / 2**10))
+            start = time.perf_counter()
+            opn = await zfH.query('opn1')
+            print('shards: {0} opn1 genes after {1:.2f} s ({2} shards in total)'.format(
+                opn.shape[0], time.perf_counter() - start, zfH.fetched))
+
+        try:
+            asyncio.run(run())
+        finally:
+            server.shutdown()
+    finally:
+        shutil.rmtree(outDir)
+
+
+if __name__ == '__main__':
+    import sys
+    _demo(float(sys.argv[1]) if len(sys.argv) > 1 else 0.)
@@ -0,0 +1,459 @@
+"""fx_sharedData
+
+    Shared-memory dataset host for several explorer kernels on the same machine
+    A host process loads the expression tables once (through the columnar cache, fx_dataCache)
+    into multiprocessing.shared_memory blocks: every column plus the sorted order of the gene
+    symbols (the symbol index). Kernels attach to the blocks and read the columns as read-only
+    numpy views, without parsing or copying, so a dataset takes its memory once whatever the
+    number of kernels and a new kernel can plot right away.
+        python fx_sharedData.py data/*.csv          # host: serves until Ctrl-C
+        # in every kernel
+        zfH = attachDataset('Hoang2020_10x_photoreceptors')
+        plotBars_Hoang2020(zfH.index, 'rho')
+        heatmap_Hoang2020(zfH.index, genes='opn1', norm='max')
+    A host can also live in a notebook (host = DatasetHost(sources) ... host.close()). Blocks are
+    named after the content hash of their csv, so a changed csv gets a new block; kernels attached
+    to the old one keep it until they exit. The manifest of the datasets is published as a new
+    block for every change; a small fixed block, rewritten in place, holds its generation, so
+    kernels never find the manifest missing while the host updates it. One host per prefix: a second
+    host refuses to start while the first is running, and takes over the blocks of one that was
+    killed. Try it with
+        python fx_sharedData.py --demo              # memory and time to first plot of 4 kernels
+"""
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+
+from fx_dataCache import CachedDataset, loadDataset
+from fx_timing import currentSpan, timed
+
+SHARED_VERSION = 2
+defaultPrefix = 'juanPlot'
+# fixed block of a host: version, generation of the current manifest block, pid of the host and
+# of its resource tracker
+_pointerFormat = '<qqqq'
+# start of every array in a block (bytes)
+_alignment = 64
+# blocks created by hosts in this process (their registration with the resource tracker is kept)
+_hosted = set()
+
+
+def _pointerName(prefix):
+    return prefix + '_manifest'
+
+
+def _manifestName(prefix, generation):
+    return '{0}_manifest{1}'.format(prefix, generation)
+
+
+def _attach(name):
+    """Opens an existing block without tying its lifetime to this process"""
+    from multiprocessing import shared_memory
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    shm = shared_memory.SharedMemory(name)
+    if os.name == 'posix' and name not in _hosted:
+        # before python 3.13 the resource tracker of this process unlinks the block when the
+        # process exits, taking it away from the host and every other kernel
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _isRunning(pid):
+    """Whether a process exists (the pid of a killed host has none)"""
+    if os.name != 'posix':
+        # elsewhere blocks disappear with the processes holding them: an existing block has a live host
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _trackerPid():
+    """pid of the resource tracker that unlinks the blocks of this process when it exits (0: none)"""
+    if os.name != 'posix':
+        return 0
+    from multiprocessing import resource_tracker
+    resource_tracker.ensure_running()
+    return resource_tracker._resource_tracker._pid or 0
+
+
+def _unlinkStale(name):
+    """Removes a block left behind by a host that did not close (it may be incomplete)
+    Only called once the prefix is claimed (see DatasetHost._claim): no running host owns the block.
+    """
+    from multiprocessing import shared_memory
+    try:
+        stale = shared_memory.SharedMemory(name)
+    except FileNotFoundError:
+        # already removed by the tracker of the dead host
+        return
+    stale.close()
+    stale.unlink()
+
+
+def _encodeStrings(values):
+    """utf-8 bytes of an object array of strings, their end offsets and the mask of missing values"""
+    missing = np.array([v != v or v is None for v in values], dtype=bool)
+    encoded = [b'' if m else str(v).encode('utf-8') for v, m in zip(values, missing)]
+    offsets = np.cumsum([len(e) for e in encoded], dtype=np.int64)
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets, missing
+
+
+def _decodeStrings(data, offsets, missing=None):
+    data = data.tobytes()
+    starts = [0] + offsets[:-1].tolist()
+    values = np.array([data[a:b].decode('utf-8') for a, b in zip(starts, offsets.tolist())], dtype=object)
+    if missing is not None:
+        values[missing] = np.nan
+    return values
+
+
+class SharedDataset(CachedDataset):
+    """Dataset attached to a shared-memory block; columns are read-only views of the block
+    Same interface as CachedDataset (columns, column, symbols, rows, index, version, toFrame).
+    Derived arrays (normalized matrices, clustering, ...) are still computed per kernel, on its GeneIndex.
+    """
+
+    def __init__(self, name, entry, shm):
+        super().__init__(None, entry)
+        self.name = name
+        self.block = entry['block']
+        self._arrays = entry['arrays']
+        self._shm = shm
+        # sorted symbol order, so GeneIndex does not sort again
+        self.symbolOrder = self._array('order')
+
+    def _array(self, key):
+        offset, dtype, shape = self._arrays[key]
+        view = np.ndarray(tuple(shape), dtype=np.dtype(dtype), buffer=self._shm.buf, offset=offset)
+        view.flags.writeable = False
+        return view
+
+    def column(self, column):
+        """Values of one column (by name or position): a view for numeric columns, decoded once for strings"""
+        i = self._position(column)
+        if i not in self._columns:
+            key = 'col{0:03d}'.format(i)
+            if self.kinds[i] == 'numeric':
+                self._columns[i] = self._array(key)
+            else:
+                missing = self._array(key + '.na') if key + '.na' in self._arrays else None
+                self._columns[i] = _decodeStrings(self._array(key + '.bytes'), self._array(key + '.offsets'), missing)
+        return self._columns[i]
+
+    def __repr__(self):
+        return 'SharedDataset({0!r}, {1} rows, block {2})'.format(self.name, self.shape[0], self.block)
+
+
+class DatasetHost:
+    """Owner of the shared-memory blocks of a set of datasets
+    Arguments:
+        sources     : dict name -> csv path, or a list of csv paths (named after the file)
+        prefix      : prefix of the block names; kernels attach with the same prefix
+    The blocks stay available until close() (also called when used as a context manager).
+    Raises RuntimeError while another host of the same prefix is running.
+    """
+
+    def __init__(self, sources=(), prefix=defaultPrefix):
+        self.prefix = prefix
+        self.entries = {}
+        self._blocks = {}
+        self._manifest = None
+        self._generation = 0
+        self._pointer = self._claim()
+        if not isinstance(sources, dict):
+            sources = {os.path.splitext(os.path.basename(path))[0]: path for path in sources}
+        try:
+            for name, csvPath in sources.items():
+                self.add(name, csvPath, publish=False)
+            self._publish()
+        except BaseException:
+            # release the prefix, or this process would block every later host
+            self.close()
+            raise
+
+    @timed('DatasetHost.add')
+    def add(self, name, csvPath, publish=True):
+        """Loads a csv into a shared block (replacing a dataset of the same name)"""
+        span = currentSpan()
+        dataset = loadDataset(csvPath)
+        block = '{0}_{1}'.format(self.prefix, dataset.version[:12])
+        arrays = {}
+        for i, kind in enumerate(dataset.kinds):
+            key = 'col{0:03d}'.format(i)
+            if kind == 'numeric':
+                arrays[key] = np.asarray(dataset.column(i))
+            else:
+                data, offsets, missing = _encodeStrings(dataset.column(i))
+                arrays[key + '.bytes'], arrays[key + '.offsets'] = data, offsets
+                if missing.any():
+                    arrays[key + '.na'] = missing
+        symbols = [str(s) for s in dataset.symbols]
+        arrays['order'] = np.array(sorted(range(len(symbols)), key=symbols.__getitem__), dtype=np.int64)
+        span.mark('load')
+        layout, size = {}, 0
+        for key, values in arrays.items():
+            layout[key] = [size, values.dtype.str, list(values.shape)]
+            size += -(-max(values.nbytes, 1) // _alignment) * _alignment
+        if block not in self._blocks:
+            shm = self._create(block, size)
+            for key, values in arrays.items():
+                offset = layout[key][0]
+                np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf, offset=offset)[...] = values
+            self._blocks[block] = shm
+        span.mark('copy')
+        old = self.entries.get(name)
+        self.entries[name] = dict(dataset.header, block=block, size=size, arrays=layout)
+        if old is not None and old['block'] != block:
+            self._release(old['block'])
+        if publish:
+            self._publish()
+        if span:
+            span.note(rows=dataset.shape[0], bytes=size)
+        return self.entries[name]
+
+    def remove(self, name):
+        """Drops a dataset (kernels attached to it keep their views until they exit)"""
+        entry = self.entries.pop(name)
+        self._release(entry['block'])
+        self._publish()
+
+    def _release(self, block):
+        if any(entry['block'] == block for entry in self.entries.values()):
+            return
+        shm = self._blocks.pop(block)
+        shm.close()
+        shm.unlink()
+        _hosted.discard(block)
+
+    def _claim(self):
+        """Creates the pointer block of the prefix, replacing one left by a host that was killed"""
+        from multiprocessing import shared_memory
+        name = _pointerName(self.prefix)
+        size = struct.calcsize(_pointerFormat)
+        try:
+            pointer = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            other = _attach(name)
+            try:
+                version, _, pid, trackerPid = struct.unpack_from(_pointerFormat, other.buf) if other.size >= size else (None, 0, 0, 0)
+            finally:
+                other.close()
+            if version != SHARED_VERSION:
+                raise RuntimeError('a dataset host of another version holds prefix {0!r}; stop it or use another prefix'.format(
+                    self.prefix)) from None
+            if _isRunning(pid):
+                raise RuntimeError('a dataset host (pid {0}) is already running with prefix {1!r}; close it or use another prefix'.format(
+                    pid, self.prefix)) from None
+            # the tracker of a killed host outlives it briefly and unlinks its blocks: let it finish,
+            # or it would remove the blocks created here under the same names
+            for _ in range(50):
+                if not trackerPid or not _isRunning(trackerPid):
+                    break
+                time.sleep(.1)
+            _unlinkStale(name)
+            # a host starting at the same time may win the prefix: it then raises FileExistsError
+            pointer = shared_memory.SharedMemory(name, create=True, size=size)
+        _hosted.add(name)
+        # generation 0: nothing published yet
+        self._pids = os.getpid(), _trackerPid()
+        struct.pack_into(_pointerFormat, pointer.buf, 0, SHARED_VERSION, 0, *self._pids)
+        return pointer
+
+    def _create(self, name, size):
+        from multiprocessing import shared_memory
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            _unlinkStale(name)
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        _hosted.add(name)
+        return shm
+
+    def _publish(self):
+        """Writes the manifest kernels read to find the datasets
+        The manifest goes to a new block, complete before its generation is written to the pointer
+        block; the previous manifest block is removed afterwards (see _readManifest).
+        """
+        data = json.dumps({'version': SHARED_VERSION, 'datasets': self.entries}).encode('utf-8')
+        self._generation += 1
+        manifest = self._create(_manifestName(self.prefix, self._generation), 8 + len(data))
+        manifest.buf[:8] = struct.pack('<q', len(data))
+        manifest.buf[8:8 + len(data)] = data
+        struct.pack_into(_pointerFormat, self._pointer.buf, 0, SHARED_VERSION, self._generation, *self._pids)
+        if self._manifest is not None:
+            self._manifest.close()
+            self._manifest.unlink()
+            _hosted.discard(self._manifest.name)
+        self._manifest = manifest
+
+    @property
+    def nbytes(self):
+        """Bytes of all shared blocks"""
+        return sum(shm.size for shm in self._blocks.values())
+
+    def close(self):
+        """Removes all blocks and the manifest"""
+        for block, shm in self._blocks.items():
+            shm.close()
+            shm.unlink()
+            _hosted.discard(block)
+        self._blocks.clear()
+        self.entries.clear()
+        for shm in (self._pointer, self._manifest):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+                _hosted.discard(shm.name)
+        self._pointer = self._manifest = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def listDatasets(prefix=defaultPrefix):
+    """Datasets published by the host of a prefix: dict name -> {'rows', 'bytes', 'source'}"""
+    return {name: {'rows': entry['nRows'], 'bytes': entry['size'], 'source': entry['source']}
+        for name, entry in _readManifest(prefix).items()}
+
+
+def _readManifest(prefix, retries=100):
+    try:
+        pointer = _attach(_pointerName(prefix))
+    except FileNotFoundError:
+        raise FileNotFoundError('no dataset host with prefix {0!r} is running (python fx_sharedData.py data/*.csv)'.format(
+            prefix)) from None
+    try:
+        for _ in range(retries):
+            version, generation, _, _ = struct.unpack_from(_pointerFormat, pointer.buf)
+            if version != SHARED_VERSION:
+                raise ValueError('dataset host version {0}, expected {1}'.format(version, SHARED_VERSION))
+            if generation == 0:
+                raise FileNotFoundError('the dataset host with prefix {0!r} is still loading its datasets'.format(prefix))
+            try:
+                shm = _attach(_manifestName(prefix, generation))
+            except FileNotFoundError:
+                # the host published a newer manifest and removed this one: read the pointer again
+                continue
+            try:
+                length = struct.unpack('<q', bytes(shm.buf[:8]))[0]
+                return json.loads(bytes(shm.buf[8:8 + length]).decode('utf-8'))['datasets']
+            finally:
+                shm.close()
+    finally:
+        pointer.close()
+    raise RuntimeError('the manifest of the dataset host with prefix {0!r} kept changing'.format(prefix))
+
+
+# datasets attached by this process, by (prefix, name, block): attaching again returns the same
+# object, with its GeneIndex and caches
+_attached = {}
+
+
+@timed()
+def attachDataset(name, prefix=defaultPrefix):
+    """Attaches to a dataset published by a DatasetHost
+    Arguments:
+        name        : dataset name (see listDatasets)
+        prefix      : prefix of the host
+    Returns:
+        SharedDataset (use .index for plotBars_* / heatmap_*)
+    """
+    datasets = _readManifest(prefix)
+    if name not in datasets:
+        raise KeyError('{0!r} is not hosted; datasets are {1}'.format(name, sorted(datasets)))
+    entry = datasets[name]
+    key = (prefix, name, entry['block'])
+    if key not in _attached:
+        _attached[key] = SharedDataset(name, entry, _attach(entry['block']))
+    return _attached[key]
+
+
+def _privateBytes():
+    """Memory of this process not shared with others (Linux)"""
+    total = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                total += int(line.split()[1]) * 1024
+    return total
+
+
+def _demoKernel(mode, dataDir):
+    """One kernel of the demo: prints seconds to index every dataset, to the first plot and the private memory used"""
+    import matplotlib
+    import pandas as pd
+    matplotlib.use('Agg')
+    from fx_RNAseqPlotters import GeneIndex, plotBars_Hoang2020
+    from fx_timing import drawFigure
+    drawFigure(tight=False)
+    before = _privateBytes()
+    start = time.perf_counter()
+    indexes = {}
+    for f in sorted(os.listdir(dataDir)):
+        if f.endswith('.csv'):
+            name = os.path.splitext(f)[0]
+            if mode == 'shared':
+                indexes[name] = attachDataset(name).index
+            else:
+                indexes[name] = GeneIndex(pd.read_csv(os.path.join(dataDir, f)))
+    ready = time.perf_counter() - start
+    plotBars_Hoang2020(indexes['Hoang2020_10x_photoreceptors'], 'rho')
+    drawFigure(tight=False)
+    print(json.dumps([ready, time.perf_counter() - start, _privateBytes() - before]))
+
+
+def _demo(nKernels=4):
+    """Hosts every csv of content/data, then starts nKernels kernel processes that index all
+    datasets and plot from the host, and the same kernels reading the csv files instead"""
+    import subprocess
+    dataDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    csvPaths = [os.path.join(dataDir, f) for f in sorted(os.listdir(dataDir)) if f.endswith('.csv')]
+    with DatasetHost(csvPaths) as host:
+        print('host: {0} datasets, {1:.1f} MB shared'.format(len(host.entries), host.nbytes / 2**20))
+        for mode in ('shared', 'csv'):
+            # independent interpreters, as separate notebook kernels are
+            kernels = [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--kernel', mode, dataDir],
+                stdout=subprocess.PIPE, text=True) for _ in range(nKernels)]
+            stats = np.array([json.loads(kernel.communicate()[0]) for kernel in kernels])
+            print('{0}: all datasets indexed after {1:.2f} s, first plot after {2:.2f} s, '
+                '{3:.1f} MB private memory per kernel ({4} kernels at once)'.format(
+                mode, *stats[:, :2].mean(axis=0), stats[:, 2].mean() / 2**20, nKernels))
+
+
+def _serve(paths, prefix=defaultPrefix):
+    import signal
+    import threading
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    with DatasetHost(paths, prefix) as host:
+        for name, entry in host.entries.items():
+            print('\t {0}: {1} rows, {2:.1f} MB'.format(name, entry['nRows'], entry['size'] / 2**20))
+        print('serving {0} datasets with prefix {1!r}; Ctrl-C to stop'.format(len(host.entries), prefix))
+        try:
+            while not stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--demo']:
+        _demo()
+    elif sys.argv[1:2] == ['--kernel']:
+        _demoKernel(*sys.argv[2:4])
+    else:
+        _serve(sys.argv[1:])
@@ -0,0 +1,199 @@
+"""fx_specificity
+
+    Cell-type specificity of every gene across the subtypes of a dataset layout
+    Scores are computed from the subtype means of all genes at once (one sort per row gives the
+    maximum, the runner-up and the Gini ordering):
+        tau     : mean of 1 - x/max over the other subtypes (0 uniform, 1 one subtype only)
+        gini    : Gini coefficient of the subtype means, scaled so one-subtype expression is 1
+        shannon : 1 - entropy / log2(subtypes) of the subtype proportions
+        fold    : highest subtype mean over the second highest
+    tau, gini and shannon use log2(x + 1) of the means (log=True), so a few very high values do
+    not dominate them. For layouts with replicate columns (Angueyra2021), bootstrap=n adds percentile confidence
+    intervals from n resamplings of the replicates within each subtype, computed as one matrix
+    product per block of genes. Scores are cached on the GeneIndex.
+        gI = GeneIndex(zfH)
+        scores = specificityTable(gI, 'Hoang2020')          # dataframe, one row per gene
+        scores[scores.group == 'UV'].sort_values('tau', ascending=False).head(20)
+        genes, tau = topSpecific(gI, 'Hoang2020', 'UV', pct('UV') > 20, k=100)
+        heatmap_Hoang2020(gI, genes=genes, norm='max')
+        specificityTable(gA, 'Angueyra2021', bootstrap=500)  # tau_lo, tau_hi, ...
+"""
+import numpy as np
+
+from fx_geneIndex import GeneIndex
+from fx_layouts import getLayout
+from fx_normalize import columnBlock, groupMeans
+from fx_timing import currentSpan, timed
+
+specificityMethods = ('tau', 'gini', 'shannon', 'fold')
+
+
+def specificityScores(means, log=False, pseudocount=0.):
+    """Specificity of every row of a (genes x subtypes) array of non-negative means
+    Arguments:
+        means       : 2D array; NaN and negative values count as 0. A 3D array (genes x
+                      resamplings x subtypes) is scored along its last axis as well.
+        log         : tau, gini and shannon of log2(means + 1); fold is always a ratio of the means
+        pseudocount : added to both means of the fold ratio
+    Returns:
+        dict of arrays: tau, gini, shannon, fold and top (position of the highest subtype);
+        scores of genes that are not expressed in any subtype are NaN
+    """
+    x = np.nan_to_num(np.asarray(means, dtype=np.float64))
+    np.maximum(x, 0, out=x)
+    n = x.shape[-1]
+    top = np.argmax(x, axis=-1)
+    if n < 2:
+        nan = np.full(x.shape[:-1], np.nan)
+        return {'tau': nan, 'gini': nan.copy(), 'shannon': nan.copy(), 'fold': nan.copy(), 'top': top}
+    # every score only depends on the sorted means
+    ordered = np.sort(x, axis=-1)
+    fold = ordered[..., -1] + pseudocount, ordered[..., -2] + pseudocount
+    if log:
+        ordered = np.log2(ordered + 1)
+    highest = ordered[..., -1]
+    total = ordered.sum(axis=-1)
+    expressed = highest > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = (n - total / highest) / (n - 1)
+        # Gini over the sorted means: sum((2i - n - 1) x_i) / (n sum x), scaled by n / (n - 1)
+        weights = 2 * np.arange(1, n + 1) - n - 1
+        gini = (ordered @ weights) / (total * (n - 1))
+        p = ordered / total[..., None]
+        entropy = -np.sum(p * np.log2(np.where(p > 0, p, 1)), axis=-1)
+        shannon = 1 - entropy / np.log2(n)
+        fold = fold[0] / fold[1]
+    scores = {'tau': tau, 'gini': gini, 'shannon': shannon, 'fold': fold}
+    for values in scores.values():
+        values[~expressed] = np.nan
+    scores['top'] = top
+    return scores
+
+
+def _resamplingWeights(groupsN, nBoot, rng):
+    """(columns x nBoot*groups) matrix: column b*groups + g averages a resampling of group g's replicates"""
+    groupsN = np.asarray(groupsN)
+    starts = np.concatenate([[0], np.cumsum(groupsN)[:-1]])
+    nGroups = groupsN.shape[0]
+    weights = np.zeros((int(groupsN.sum()), nBoot * nGroups))
+    for g, (start, n) in enumerate(zip(starts, groupsN)):
+        draws = start + rng.integers(0, n, size=(nBoot, n))
+        # each draw adds 1/n to the column of the replicate it picked
+        np.add.at(weights, (draws.ravel(), np.repeat(np.arange(nBoot) * nGroups + g, n)), 1 / n)
+    return weights
+
+
+def _percentiles(values, qs):
+    """Nearest-rank percentiles along axis 1, ignoring NaN (np.nanpercentile loops over rows)
+    Nearest rank also keeps infinite fold ratios, which interpolation would turn into NaN.
+    """
+    ordered = np.sort(values, axis=1)
+    nValid = np.count_nonzero(~np.isnan(values), axis=1)
+    out = []
+    for q in qs:
+        rank = np.rint(q / 100 * np.maximum(nValid - 1, 0)).astype(np.intp)
+        result = np.take_along_axis(ordered, rank[:, None], axis=1)[:, 0]
+        result[nValid == 0] = np.nan
+        out.append(result)
+    return out
+
+
+def bootstrapScores(data, groupsN, nBoot=200, ci=.95, log=True, pseudocount=0., seed=0, blockRows=2048):
+    """Percentile confidence intervals of the specificity scores by resampling replicates
+    Replicates are drawn with replacement within each subtype; subtypes with a single column
+    keep their value. All resamplings of a block of genes are one matrix product.
+    Arguments:
+        data        : 2D array (genes x replicate columns, grouped by subtype)
+        groupsN     : number of columns per subtype
+        nBoot       : number of resamplings
+        ci          : confidence level
+        log         : see specificityScores
+        pseudocount : see specificityScores
+        seed        : seed of the random generator (same seed, same intervals)
+        blockRows   : genes per block (memory is about blockRows x nBoot x subtypes floats)
+    Returns:
+        dict method -> (low, high) arrays
+    """
+    groupsN = np.asarray(groupsN)
+    if not np.any(groupsN > 1):
+        raise ValueError('bootstrap needs replicate columns; every subtype of this layout has a single column')
+    data = np.nan_to_num(np.asarray(data, dtype=np.float64))
+    nGroups = groupsN.shape[0]
+    weights = _resamplingWeights(groupsN, nBoot, np.random.default_rng(seed))
+    tail = 100 * (1 - ci) / 2
+    intervals = {m: (np.empty(data.shape[0]), np.empty(data.shape[0])) for m in specificityMethods}
+    for start in range(0, data.shape[0], blockRows):
+        block = data[start:start + blockRows]
+        means = (block @ weights).reshape(block.shape[0], nBoot, nGroups)
+        scores = specificityScores(means, log, pseudocount)
+        for m in specificityMethods:
+            low, high = _percentiles(scores[m], (tail, 100 - tail))
+            intervals[m][0][start:start + blockRows] = low
+            intervals[m][1][start:start + blockRows] = high
+    return intervals
+
+
+@timed()
+def datasetSpecificity(geneIndex, layout, pctPlot=False, log=True, pseudocount=0., bootstrap=0, ci=.95, seed=0):
+    """Scores (and bootstrap intervals) of every gene of an indexed dataset, cached on the GeneIndex"""
+    span = currentSpan()
+    key = ('specificity', layout.name, pctPlot, log, pseudocount, bootstrap, ci if bootstrap else None, seed if bootstrap else None)
+    cached = key in geneIndex.cache
+    if not cached:
+        raw = columnBlock(geneIndex.data, layout.columns(pctPlot))
+        scores = specificityScores(groupMeans(raw, layout.groupsN), log, pseudocount)
+        span.mark('scores')
+        if bootstrap:
+            for m, (low, high) in bootstrapScores(raw, layout.groupsN, bootstrap, ci, log, pseudocount, seed).items():
+                scores[m + '_lo'], scores[m + '_hi'] = low, high
+            span.mark('bootstrap')
+        geneIndex.cache[key] = scores
+    span.note(cached=cached)
+    return geneIndex.cache[key]
+
+
+def specificityTable(data, layout, pctPlot=False, log=True, pseudocount=0., bootstrap=0, ci=.95, seed=0):
+    """Specificity scores of every gene as a sortable dataframe
+    Arguments:
+        data        : GeneIndex (or dataframe / CachedDataset) of the dataset; a GeneIndex keeps the scores cached
+        layout      : DatasetLayout or its name (its groups are the subtypes compared)
+        pctPlot     : score percent of cells expressing instead of average counts
+        log         : tau, gini and shannon of log2(mean + 1)
+        pseudocount : added to both means of the fold ratio
+        bootstrap   : number of replicate resamplings for confidence intervals (0: none)
+        ci          : confidence level of the intervals
+        seed        : seed of the resampling
+    Returns:
+        pandas dataframe indexed by symbol: group (highest subtype), tau, gini, shannon, fold
+        and, with bootstrap, <score>_lo / <score>_hi for each score
+    """
+    import pandas as pd
+    index = data if isinstance(data, GeneIndex) else GeneIndex(data)
+    layout = getLayout(layout)
+    scores = datasetSpecificity(index, layout, pctPlot, log, pseudocount, bootstrap, ci, seed)
+    columns = {'group': layout.groupsLabels[scores['top']]}
+    columns.update((name, values) for name, values in scores.items() if name != 'top')
+    return pd.DataFrame(columns, index=pd.Index(index.symbols, name='symbol'))
+
+
+def topSpecific(data, layout, group, *conditions, method='tau', k=100, pctPlot=False, log=True, pseudocount=0.):
+    """Genes whose highest subtype is group, most specific first
+    Arguments:
+        data        : GeneIndex (or dataframe) of the dataset; a GeneIndex keeps the scores cached
+        layout      : DatasetLayout or its name
+        group       : subtype label (e.g. 'UV')
+        conditions  : extra conditions of queryGenes (e.g. pct('UV') > 30 or avg('UV') > 1);
+                      barely expressed genes seen in one subtype only all score as fully specific
+        method      : 'tau', 'gini', 'shannon' or 'fold'
+        k           : number of genes returned (None: all)
+        pctPlot, log, pseudocount : see specificityTable
+    Returns:
+        genes       : gene symbols (pass as genes= to heatmap_*)
+        scores      : score of each gene
+    """
+    from fx_enrichment import QueryEngine, specificity
+    engine = QueryEngine(data, layout)
+    rank = specificity(method, group, pctPlot, log, pseudocount)
+    # genes peaking in another subtype have NaN scores
+    positions, values = engine.select([rank > -np.inf] + list(conditions), rank, k=k)
+    return engine.index.symbols[positions].tolist(), values
@@ -0,0 +1,241 @@
+"""fx_timing
+
+    Opt-in timing of the plotting and loading functions
+    The instrumented functions (loadDataset, GeneIndex, normalizedDataset, plotBars_dataset,
+    heatmap_dataset, heatmap_general, ...) record nested spans with row and artist counts
+    while timing is enabled; when it is disabled each instrumented call costs one flag check.
+        with timing() as t:
+            heatmap_Hoang2020(gI, genes='opn', norm='max', ax=ax)
+            drawFigure(fig)                 # tight_layout and canvas draw, timed
+        print(t.summary())                  # one tree per call
+        print(t.report())                   # totals per span over all calls
+    enableTiming() / disableTiming() switch it globally; timingCalls() returns what was recorded.
+"""
+import time
+from functools import wraps
+
+enabled = False
+# spans currently open (innermost last) and finished top-level spans
+_stack = []
+_calls = []
+# open timing() blocks, each collecting the calls finished inside it
+_records = []
+# number of finished top-level calls kept while timing is enabled globally
+maxCalls = 1000
+
+
+class Span:
+    """Timed section: name, duration (s), info (rows, artists, ...) and nested spans"""
+    __slots__ = ('name', 'info', 'children', 'start', 'duration', '_last')
+
+    def __init__(self, name, info=None):
+        self.name = name
+        self.info = info or {}
+        self.children = []
+        self.start = None
+        self.duration = None
+        self._last = None
+
+    def __bool__(self):
+        return True
+
+    def __enter__(self):
+        if _stack:
+            _stack[-1].children.append(self)
+        _stack.append(self)
+        self.start = self._last = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.duration = end - self.start
+        _stack.pop()
+        if _stack:
+            # marks of the parent start counting after this span
+            _stack[-1]._last = end
+        else:
+            _calls.append(self)
+            if len(_calls) > maxCalls:
+                del _calls[0]
+            for record in _records:
+                record.calls.append(self)
+        return False
+
+    def note(self, **info):
+        """Adds counts or labels to this span (e.g. rows=120, artists=36)"""
+        self.info.update(info)
+
+    def mark(self, name, **info):
+        """Closes a sequential step: a child span covering the time since the previous mark"""
+        now = time.perf_counter()
+        step = Span(name, info)
+        step.start, step.duration = self._last, now - self._last
+        self.children.append(step)
+        self._last = now
+        return step
+
+
+class _NullSpan:
+    """Stand-in returned while timing is disabled; every method is a no-op"""
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def note(self, **info):
+        pass
+
+    def mark(self, name, **info):
+        return self
+
+
+_nullSpan = _NullSpan()
+
+
+def span(name, **info):
+    """Context manager timing a section (a no-op while timing is disabled)"""
+    if not enabled:
+        return _nullSpan
+    return Span(name, info)
+
+
+def currentSpan():
+    """Innermost open span, or a no-op span (falsy) while timing is disabled"""
+    if not enabled or not _stack:
+        return _nullSpan
+    return _stack[-1]
+
+
+def timed(name=None):
+    """Decorator recording every call of a function as a span"""
+    def decorator(fn):
+        spanName = name or fn.__name__
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            with Span(spanName):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def countArtists(artist):
+    """Number of artists in a figure or axes (including itself)"""
+    return len(artist.findobj())
+
+
+def drawFigure(fig=None, tight=True):
+    """tight_layout (optional) and a full canvas draw, timed as separate spans"""
+    if fig is None:
+        import matplotlib.pyplot as plt
+        fig = plt.gcf()
+    with span('drawFigure') as s:
+        if tight:
+            fig.tight_layout()
+            s.mark('tight_layout')
+        fig.canvas.draw()
+        s.mark('draw')
+        if s:
+            s.note(artists=countArtists(fig))
+    return fig
+
+
+def enableTiming():
+    global enabled
+    enabled = True
+
+
+def disableTiming():
+    global enabled
+    enabled = False
+
+
+def timingCalls():
+    """Top-level spans recorded so far"""
+    return list(_calls)
+
+
+def clearTiming():
+    del _calls[:]
+
+
+def _formatInfo(info):
+    return '  '.join('{0}={1}'.format(k, v) for k, v in info.items())
+
+
+def timingSummary(calls):
+    """Table with one indented tree of spans per call"""
+    lines = ['{0:<44} {1:>10} {2:>7}  {3}'.format('call / span', 'ms', '%', 'info')]
+    def walk(s, depth, total):
+        label = '  ' * depth + s.name
+        lines.append('{0:<44} {1:10.2f} {2:7.1f}  {3}'.format(label, s.duration * 1000,
+            100 * s.duration / total if total else 0, _formatInfo(s.info)))
+        for child in s.children:
+            walk(child, depth + 1, total)
+    for call in calls:
+        walk(call, 0, call.duration)
+    return '\n'.join(lines)
+
+
+def timingReport(calls):
+    """Table of totals per span path over all calls (count, total, mean and max ms)"""
+    stats = {}
+    def walk(s, path):
+        path = path + (s.name,)
+        if path not in stats:
+            stats[path] = [0, 0., 0., len(stats)]
+        entry = stats[path]
+        entry[0] += 1
+        entry[1] += s.duration
+        entry[2] = max(entry[2], s.duration)
+        for child in s.children:
+            walk(child, path)
+    for call in calls:
+        walk(call, ())
+    lines = ['{0:<44} {1:>6} {2:>10} {3:>10} {4:>10}'.format('span', 'calls', 'total ms', 'mean ms', 'max ms')]
+    # depth-first order: every span path right below its parent, in order of first appearance
+    rank = lambda path: tuple(stats[path[:i + 1]][3] for i in range(len(path)))
+    for path in sorted(stats, key=rank):
+        n, total, longest = stats[path][:3]
+        label = '  ' * (len(path) - 1) + path[-1]
+        lines.append('{0:<44} {1:6d} {2:10.2f} {3:10.2f} {4:10.2f}'.format(label, n, total * 1000, total * 1000 / n, longest * 1000))
+    return '\n'.join(lines)
+
+
+class TimingRecord:
+    """Calls recorded inside a timing() block"""
+
+    def __init__(self):
+        self.calls = []
+        self._previous = None
+
+    def __enter__(self):
+        global enabled
+        self._previous = enabled
+        enabled = True
+        _records.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        global enabled
+        enabled = self._previous
+        _records.remove(self)
+        return False
+
+    def summary(self):
+        return timingSummary(self.calls)
+
+    def report(self):
+        return timingReport(self.calls)
+
+
+def timing():
+    """Context manager enabling timing for a block; returns a TimingRecord"""
+    return TimingRecord()
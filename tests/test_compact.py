@@ -0,0 +1,47 @@
+"""Tests of fx_compact.loadCompact chunked reading"""
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'content'))
+
+from fx_compact import loadCompact
+from fx_layouts import getLayout
+
+
+def _csv(genename):
+    """Csv with the Hoang2020 column layout and the given genename values"""
+    layout = getLayout('Hoang2020')
+    nColumns = max(int(i) for i in layout.valueColumns) + 1
+    columns = ['symbol'] + ['c{0}'.format(i) for i in range(1, nColumns)] + ['genename']
+    rows = [['g{0}'.format(r)] + [str(r + c) for c in range(1, nColumns)] + [name] for r, name in enumerate(genename)]
+    text = ','.join(columns) + '\n' + '\n'.join(','.join(row) for row in rows) + '\n'
+    return io.StringIO(text)
+
+
+def test_missing_chunk_before_strings():
+    names = ['', '', 'a', 'b', 'c', 'd']
+    frame = loadCompact(_csv(names), 'Hoang2020', keep=['genename'], chunksize=2, verbose=False)
+    assert frame.shape[0] == 6
+    assert frame.genename.isna().tolist() == [True, True, False, False, False, False]
+    assert frame.genename.iloc[2:].tolist() == ['a', 'b', 'c', 'd']
+
+
+def test_numeric_chunk_in_string_column():
+    names = ['a', 'b', '12', '', 'c', 'd']
+    frame = loadCompact(_csv(names), 'Hoang2020', keep=['genename'], chunksize=2, verbose=False)
+    expected = pd.read_csv(_csv(names)).genename
+    assert frame.genename.isna().tolist() == expected.isna().tolist()
+    assert frame.genename.dropna().tolist() == expected.dropna().tolist()
+
+
+def test_values_match_read_csv():
+    names = ['a', 'b', 'c', 'd', 'e', 'f']
+    frame = loadCompact(_csv(names), 'Hoang2020', keep=['genename'], chunksize=4, verbose=False)
+    expected = pd.read_csv(_csv(names))
+    columns = [int(i) for i in getLayout('Hoang2020').valueColumns]
+    np.testing.assert_array_equal(frame.iloc[:, columns].to_numpy(np.float64), expected.iloc[:, columns].to_numpy(np.float64))
+    assert frame.symbol.tolist() == expected.symbol.tolist()